@@ -7,6 +7,8 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/add_lcsc_numbers.py').read())
 """
 
+import re
+
 import pcbnew
 
 # LCSC Part Number Mapping
@@ -27,6 +29,15 @@ LCSC_MAPPING = {
     # "10uF": "C15850",   # 0805 10µF capacitor
 }
 
+# Reference prefixes that are never placed/assembled (test points, holes, ...)
+SKIP_PREFIXES = ("TP", "H", "MH", "FID", "LOGO")
+
+# Leading letters of a reference designator (e.g., D123 -> D)
+_REF_PREFIX_RE = re.compile(r'[A-Za-z]+')
+
+# Footprint field names that hold the LCSC part number (compared upper-case)
+LCSC_FIELD_NAMES = frozenset({"LCSC", "LCSC PART", "LCSC_PART", "LCSC PART #", "JLCPCB"})
+
 # Alternative: Map by reference pattern
 # Useful when all components of same type use same LCSC number
 LCSC_BY_REFERENCE = {
@@ -41,7 +52,7 @@ def add_lcsc_field(footprint, lcsc_number):
     # Check if LCSC field already exists
     field_found = False
     for field in footprint.GetFields():
-        if field.GetName().upper() in ["LCSC", "LCSC PART", "LCSC_PART"]:
+        if field.GetName().upper() in LCSC_FIELD_NAMES:
             field.SetText(lcsc_number)
             field_found = True
             break
@@ -67,27 +78,22 @@ def assign_lcsc_numbers():
 
     for fp in board.GetFootprints():
         ref = fp.GetReference()
-        value = fp.GetValue()
-        footprint_name = fp.GetFPID().GetLibItemName().GetUniString()
 
-        # Skip special components
-        skip_prefixes = ["TP", "H", "MH", "FID", "LOGO", ""]
-        if any(ref.startswith(prefix) for prefix in skip_prefixes):
+        # Skip special components before fetching anything else from pcbnew
+        if ref.startswith(SKIP_PREFIXES):
             continue
 
-        lcsc_number = None
+        value = fp.GetValue()
+        footprint_name = fp.GetFPID().GetLibItemName().GetUniString()
+
+        # Try value, then footprint name (one dict lookup each); empty
+        # mapping entries fall through to the next source
+        lcsc_number = LCSC_MAPPING.get(value) or LCSC_MAPPING.get(footprint_name)
 
-        # Try to find LCSC by value
-        if value in LCSC_MAPPING:
-            lcsc_number = LCSC_MAPPING[value]
-        # Try to find by footprint name
-        elif footprint_name in LCSC_MAPPING:
-            lcsc_number = LCSC_MAPPING[footprint_name]
         # Try to find by reference prefix
-        else:
-            ref_prefix = ''.join(c for c in ref if c.isalpha())
-            if ref_prefix in LCSC_BY_REFERENCE:
-                lcsc_number = LCSC_BY_REFERENCE[ref_prefix]
+        if not lcsc_number:
+            m = _REF_PREFIX_RE.match(ref)
+            lcsc_number = LCSC_BY_REFERENCE.get(m.group(0)) if m else None
 
         if lcsc_number:
             add_lcsc_field(fp, lcsc_number)
@@ -13,7 +13,9 @@ Or run from command line:
 import pcbnew
 import csv
 from collections import defaultdict
+from operator import itemgetter
 import os
+import re
 
 # Output file configuration
 OUTPUT_DIR = "bom"
@@ -27,45 +29,60 @@ BOM_COLUMNS = [
     "LCSC Part #",       # LCSC part number (if available)
 ]
 
+# Reference prefixes that are never placed/assembled (test points, holes, ...)
+SKIP_PREFIXES = ("TP", "H", "MH", "FID", "LOGO")
 
-def get_all_footprints(board):
-    """Get all footprints from the board"""
-    footprints = []
-    for fp in board.GetFootprints():
-        footprints.append(fp)
-    return footprints
+# Footprint field names that hold the LCSC part number (compared upper-case)
+LCSC_FIELD_NAMES = frozenset({"LCSC", "LCSC PART", "LCSC_PART", "LCSC PART #", "JLCPCB"})
+
+# Footprint name -> index of its LCSC field in GetFields(), filled on first find
+_LCSC_FIELD_IDX = {}
+
+# Reference designator split into prefix and number (e.g., D123 -> D, 123)
+_REF_RE = re.compile(r'([A-Z]+)(\d+)')
 
 
-def extract_lcsc_part_number(footprint):
+def extract_lcsc_part_number(footprint, footprint_name):
     """Extract LCSC part number from footprint properties"""
+    fields = footprint.GetFields()
+
+    # Footprints from the same library share a field layout, so try the slot
+    # where the LCSC field was last found for this footprint name first
+    idx = _LCSC_FIELD_IDX.get(footprint_name)
+    if idx is not None and idx < len(fields):
+        field = fields[idx]
+        if field.GetName().upper() in LCSC_FIELD_NAMES:
+            return field.GetText()
+
     # Check custom fields for LCSC part number
-    for field in footprint.GetFields():
-        field_name = field.GetName().upper()
-        if field_name in ["LCSC", "LCSC PART", "LCSC_PART", "LCSC PART #", "JLCPCB"]:
+    for idx, field in enumerate(fields):
+        if field.GetName().upper() in LCSC_FIELD_NAMES:
+            _LCSC_FIELD_IDX[footprint_name] = idx
             return field.GetText()
 
     # Check description or other properties
     return ""
 
 
-def group_components(footprints):
-    """Group components by value and footprint"""
+def group_components(board):
+    """Group the board's components by value and footprint"""
     groups = defaultdict(list)
 
-    for fp in footprints:
+    for fp in board.GetFootprints():
         # Skip if component is on back side and marked as "Do Not Place"
         # or if it's a test point, mounting hole, etc.
         ref = fp.GetReference()
-        value = fp.GetValue()
-        footprint_name = fp.GetFPID().GetLibItemName().GetUniString()
 
         # Skip certain reference prefixes that typically aren't placed
-        skip_prefixes = ["TP", "H", "MH", "FID", "LOGO", ""]
-        if any(ref.startswith(prefix) for prefix in skip_prefixes):
+        # (checked before the remaining pcbnew getters are called)
+        if ref.startswith(SKIP_PREFIXES):
             continue
 
+        value = fp.GetValue()
+        footprint_name = fp.GetFPID().GetLibItemName().GetUniString()
+
         # Create grouping key
-        lcsc = extract_lcsc_part_number(fp)
+        lcsc = extract_lcsc_part_number(fp, footprint_name)
         key = (value, footprint_name, lcsc)
         groups[key].append(ref)
 
@@ -75,51 +92,63 @@ def group_components(footprints):
 def sort_references(refs):
     """Sort reference designators naturally (D1, D2, D10 instead of D1, D10, D2)"""
     def natural_key(ref):
-        import re
         # Split into prefix and number
-        match = re.match(r'([A-Z]+)(\d+)', ref)
-        if match:
-            prefix, number = match.groups()
-            return (prefix, int(number))
-        return (ref, 0)
-
+        m = _REF_RE.match(ref)
+        return (m.group(1), int(m.group(2))) if m else (ref, 0)
+
+    # Groups are normally homogeneous (all D*, all R*, ...): strip the shared
+    # prefix once and sort on the integer suffix alone
+    m = _REF_RE.match(refs[0])
+    if m:
+        prefix_len = len(m.group(1))
+        prefix = refs[0][:prefix_len]
+        if all(ref.startswith(prefix) and ref[prefix_len:].isdigit() for ref in refs):
+            return sorted(refs, key=lambda ref: int(ref[prefix_len:]))
+
+    # Mixed prefixes or non-numeric suffixes: use the full natural key
     return sorted(refs, key=natural_key)
 
 
 def generate_bom(board, output_path):
-    """Generate BOM and save to CSV"""
-    footprints = get_all_footprints(board)
-    groups = group_components(footprints)
-
-    # Prepare BOM data
-    bom_data = []
+    """
+    Generate BOM and save to CSV.
+    Returns rows as (comment, designators, footprint, lcsc) tuples.
+    """
+    groups = group_components(board)
+
+    # Prepare BOM data, keyed by (first designator's prefix letter, value).
+    # The key is taken from the sorted refs here instead of re-splitting the
+    # joined designator string during the sort.
+    keyed_rows = []
     total_components = 0
 
     for (value, footprint, lcsc), refs in groups.items():
         sorted_refs = sort_references(refs)
         designators = ",".join(sorted_refs)
 
-        bom_data.append({
-            "Comment": value,
-            "Designator": designators,
-            "Footprint": footprint,
-            "LCSC Part #": lcsc,
-        })
+        # Row tuple in BOM_COLUMNS order
+        row = (value, designators, footprint, lcsc)
+        keyed_rows.append(((sorted_refs[0][0], value), row))
 
         total_components += len(refs)
 
     # Sort BOM by reference designator prefix and value
-    bom_data.sort(key=lambda x: (x["Designator"].split(',')[0][0], x["Comment"]))
+    keyed_rows.sort(key=itemgetter(0))
+    bom_data = [row for _, row in keyed_rows]
 
-    # Write to CSV
-    with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=BOM_COLUMNS)
-        writer.writeheader()
-        writer.writerows(bom_data)
+    write_bom_csv(output_path, bom_data)
 
     return bom_data, total_components
 
 
+def write_bom_csv(output_path, bom_data):
+    """Write header and all BOM rows in one writerows call"""
+    with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(BOM_COLUMNS)
+        writer.writerows(bom_data)
+
+
 def print_bom_summary(bom_data, total_components):
     """Print BOM summary to console"""
     print("\n" + "="*70)
@@ -131,17 +160,17 @@ def print_bom_summary(bom_data, total_components):
     print(f"{'Qty':<6} {'Value':<20} {'Designators':<30} {'LCSC':<15}")
     print("-"*70)
 
-    for item in bom_data:
-        refs = item["Designator"].split(',')
+    for value, designators, footprint, lcsc in bom_data:
+        refs = designators.split(',')
         qty = len(refs)
 
         # Truncate long designator lists
         if len(refs) > 5:
             designators_display = f"{refs[0]}...{refs[-1]} ({qty} total)"
         else:
-            designators_display = item["Designator"]
+            designators_display = designators
 
-        print(f"{qty:<6} {item['Comment']:<20} {designators_display:<30} {item['LCSC Part #']:<15}")
+        print(f"{qty:<6} {value:<20} {designators_display:<30} {lcsc:<15}")
 
     print("="*70)
 
@@ -180,12 +209,12 @@ def main():
     print("  4. JLCPCB will match components for assembly service")
 
     # Check for missing LCSC numbers
-    missing_lcsc = [item for item in bom_data if not item["LCSC Part #"]]
+    missing_lcsc = [item for item in bom_data if not item[3]]
     if missing_lcsc:
         print(f"\n⚠ Warning: {len(missing_lcsc)} parts missing LCSC numbers:")
-        for item in missing_lcsc[:10]:  # Show first 10
-            refs = item["Designator"].split(',')
-            print(f"  - {item['Comment']} ({len(refs)} pcs): {refs[0]}...")
+        for value, designators, footprint, lcsc in missing_lcsc[:10]:  # Show first 10
+            refs = designators.split(',')
+            print(f"  - {value} ({len(refs)} pcs): {refs[0]}...")
         if len(missing_lcsc) > 10:
             print(f"  ... and {len(missing_lcsc) - 10} more")
 
@@ -7,6 +7,8 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/place_led_matrix.py').read())
 """
 
+import os
+
 import pcbnew
 
 # Matrix configuration from README.md
@@ -22,34 +24,62 @@ START_Y = 10.0  # mm from board origin
 # LED reference prefix (e.g., "D" for D1, D2, etc.)
 LED_PREFIX = "D"
 
+# Placement aborts when the LED count doesn't match COLS × ROWS; set the
+# environment variable LED_ALLOW_MISMATCH=1 to place the LEDs found anyway
+ALLOW_MISMATCH = os.environ.get("LED_ALLOW_MISMATCH", "0") == "1"
+
+# LEDs placed between progress messages
+PROGRESS_CHUNK = 128
+
+# KiCad internal unit is fixed at 1 nm (pcbnew.FromMM(1.0) == 1000000)
+MM_TO_NM = 1_000_000
+
+# perf: resolved once here rather than on every SetPosition in the placement loop
+_VECTOR2I = pcbnew.VECTOR2I
+
+
+def mm_to_nm(mm):
+    """Convert mm to KiCad internal units without a pcbnew call"""
+    return int(round(mm * MM_TO_NM))
+
+
 def place_led_matrix():
     """Place LEDs in a 64×40 matrix pattern"""
 
     board = pcbnew.GetBoard()
 
-    # Get all footprints
-    footprints = board.GetFootprints()
+    total_leds = COLS * ROWS
 
-    # Filter LED footprints and sort by reference number
-    led_footprints = []
-    for fp in footprints:
+    # Filter LED footprints and bucket them by reference number, so the
+    # list comes out ordered without a sort
+    slots = [None] * total_leds
+    overflow = []
+    for fp in board.GetFootprints():
         ref = fp.GetReference()
         if ref.startswith(LED_PREFIX):
             try:
                 # Extract number from reference (e.g., LED123 -> 123)
                 num = int(ref[len(LED_PREFIX):])
-                led_footprints.append((num, fp))
             except ValueError:
                 print(f"Warning: Could not parse number from {ref}")
+                continue
 
-    # Sort by reference number
-    led_footprints.sort(key=lambda x: x[0])
+            if 1 <= num <= total_leds and slots[num - 1] is None:
+                slots[num - 1] = (num, fp)
+            else:
+                overflow.append((num, fp))
+
+    led_footprints = [entry for entry in slots if entry is not None]
+
+    # Out-of-range or duplicate numbers are rare; sort only when present
+    if overflow:
+        led_footprints.extend(overflow)
+        led_footprints.sort(key=lambda x: x[0])
 
-    total_leds = COLS * ROWS
     if len(led_footprints) != total_leds:
         print(f"Warning: Found {len(led_footprints)} LEDs, expected {total_leds}")
-        response = input(f"Continue anyway? (y/n): ")
-        if response.lower() != 'y':
+        if not ALLOW_MISMATCH:
+            print("Aborted. Set LED_ALLOW_MISMATCH=1 to place them anyway.")
             return
 
     # Place LEDs in row-major order (left to right, top to bottom)
@@ -57,25 +87,29 @@ def place_led_matrix():
     print(f"Pitch: {PITCH_X}mm × {PITCH_Y}mm")
     print(f"Starting position: ({START_X}, {START_Y})")
 
-    for idx, (led_num, fp) in enumerate(led_footprints):
-        # Calculate row and column (0-indexed)
-        row = idx // COLS
-        col = idx % COLS
-
-        # Calculate position in mm
-        x_mm = START_X + (col * PITCH_X)
-        y_mm = START_Y + (row * PITCH_Y)
-
-        # Convert to KiCad internal units (nanometers)
-        x_nm = pcbnew.FromMM(x_mm)
-        y_nm = pcbnew.FromMM(y_mm)
-
-        # Set position
-        fp.SetPosition(pcbnew.VECTOR2I(x_nm, y_nm))
+    # Convert origin and pitch to KiCad internal units (nanometers) once,
+    # then precompute every LED position with integer math
+    start_x_nm = mm_to_nm(START_X)
+    start_y_nm = mm_to_nm(START_Y)
+    pitch_x_nm = mm_to_nm(PITCH_X)
+    pitch_y_nm = mm_to_nm(PITCH_Y)
+
+    positions = [
+        (start_x_nm + col * pitch_x_nm, start_y_nm + row * pitch_y_nm)
+        for row, col in (divmod(idx, COLS) for idx in range(len(led_footprints)))
+    ]
+
+    # Place in fixed-size chunks and report progress between chunks, so the
+    # inner loop carries no per-LED progress check
+    total = len(led_footprints)
+    for start in range(0, total, PROGRESS_CHUNK):
+        end = min(start + PROGRESS_CHUNK, total)
+        for (led_num, fp), (x_nm, y_nm) in zip(led_footprints[start:end], positions[start:end]):
+            # Set position
+            fp.SetPosition(_VECTOR2I(x_nm, y_nm))
 
         # Progress indicator
-        if (idx + 1) % 100 == 0:
-            print(f"  Placed {idx + 1}/{len(led_footprints)} LEDs...")
+        print(f"  Placed {end}/{total} LEDs...")
 
     print(f"✓ Successfully placed {len(led_footprints)} LEDs")
 
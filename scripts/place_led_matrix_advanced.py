@@ -7,6 +7,8 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/place_led_matrix_advanced.py').read())
 """
 
+import os
+
 import pcbnew
 
 # Matrix configuration
@@ -22,6 +24,13 @@ START_Y = 10.0  # mm
 # LED reference prefix
 LED_PREFIX = "D"
 
+# Placement aborts when the LED count doesn't match COLS × ROWS; set the
+# environment variable LED_ALLOW_MISMATCH=1 to place the LEDs found anyway
+ALLOW_MISMATCH = os.environ.get("LED_ALLOW_MISMATCH", "0") == "1"
+
+# LEDs placed between progress messages
+PROGRESS_CHUNK = 128
+
 # Placement pattern options
 PATTERN_ROW_MAJOR = "row_major"          # Left-to-right, top-to-bottom
 PATTERN_SERPENTINE = "serpentine"        # Snake pattern (alternate row direction)
@@ -33,57 +42,95 @@ PLACEMENT_PATTERN = PATTERN_8LANE_SERPENTINE
 # Rotation (in degrees, 0 = normal orientation)
 LED_ROTATION = 0.0
 
+# KiCad internal unit is fixed at 1 nm (pcbnew.FromMM(1.0) == 1000000)
+MM_TO_NM = 1_000_000
+
+# perf: set_footprint_position builds one VECTOR2I per LED; resolve the class once
+_VECTOR2I = pcbnew.VECTOR2I
+
+
+def mm_to_nm(mm):
+    """Convert mm to KiCad internal units without a pcbnew call"""
+    return int(round(mm * MM_TO_NM))
+
 
 def get_led_footprints(board):
     """Get all LED footprints sorted by reference number"""
-    footprints = board.GetFootprints()
-    led_footprints = []
+    # Bucket LEDs straight into their slot by reference number (no sort);
+    # only out-of-range or duplicate numbers fall back to sorting
+    slots = [None] * (COLS * ROWS)
+    overflow = []
 
-    for fp in footprints:
+    for fp in board.GetFootprints():
         ref = fp.GetReference()
         if ref.startswith(LED_PREFIX):
             try:
                 num = int(ref[len(LED_PREFIX):])
-                led_footprints.append((num, fp))
             except ValueError:
                 print(f"Warning: Could not parse number from {ref}")
+                continue
+
+            if 1 <= num <= len(slots) and slots[num - 1] is None:
+                slots[num - 1] = (num, fp)
+            else:
+                overflow.append((num, fp))
 
-    led_footprints.sort(key=lambda x: x[0])
+    led_footprints = [entry for entry in slots if entry is not None]
+    if overflow:
+        led_footprints.extend(overflow)
+        led_footprints.sort(key=lambda x: x[0])
     return led_footprints
 
 
-def place_row_major(led_footprints):
-    """Simple row-major placement (left-to-right, top-to-bottom)"""
-    for idx, (led_num, fp) in enumerate(led_footprints):
-        row = idx // COLS
-        col = idx % COLS
+def grid_to_nm(cells):
+    """
+    Convert (row, col) grid cells to board positions in KiCad internal units.
+    Origin and pitch are converted once; each position is then integer math.
+    """
+    start_x_nm = mm_to_nm(START_X)
+    start_y_nm = mm_to_nm(START_Y)
+    pitch_x_nm = mm_to_nm(PITCH_X)
+    pitch_y_nm = mm_to_nm(PITCH_Y)
+
+    return [(start_x_nm + col * pitch_x_nm, start_y_nm + row * pitch_y_nm)
+            for row, col in cells]
+
 
-        x_mm = START_X + (col * PITCH_X)
-        y_mm = START_Y + (row * PITCH_Y)
+def place_cells(led_footprints, cells):
+    """Move each LED to its precomputed (row, col) grid cell"""
+    positions = grid_to_nm(cells)
 
-        set_footprint_position(fp, x_mm, y_mm, row)
+    # Place in fixed-size chunks and report progress between chunks, so the
+    # inner loop carries no per-LED progress check
+    total = len(led_footprints)
+    for start in range(0, total, PROGRESS_CHUNK):
+        end = min(start + PROGRESS_CHUNK, total)
+        for (led_num, fp), (row, col), (x_nm, y_nm) in zip(
+                led_footprints[start:end], cells[start:end], positions[start:end]):
+            set_footprint_position(fp, x_nm, y_nm, row)
 
-        if (idx + 1) % 100 == 0:
-            print(f"  Placed {idx + 1}/{len(led_footprints)} LEDs...")
+        print(f"  Placed {end}/{total} LEDs...")
+
+
+def place_row_major(led_footprints):
+    """Simple row-major placement (left-to-right, top-to-bottom)"""
+    cells = [divmod(idx, COLS) for idx in range(len(led_footprints))]
+    place_cells(led_footprints, cells)
 
 
 def place_serpentine(led_footprints):
     """Serpentine pattern - alternates direction each row"""
-    for idx, (led_num, fp) in enumerate(led_footprints):
-        row = idx // COLS
-        col = idx % COLS
+    cells = []
+    for idx in range(len(led_footprints)):
+        row, col = divmod(idx, COLS)
 
         # Reverse column order on odd rows
-        if row % 2 == 1:
+        if row & 1:
             col = COLS - 1 - col
 
-        x_mm = START_X + (col * PITCH_X)
-        y_mm = START_Y + (row * PITCH_Y)
-
-        set_footprint_position(fp, x_mm, y_mm, row)
+        cells.append((row, col))
 
-        if (idx + 1) % 100 == 0:
-            print(f"  Placed {idx + 1}/{len(led_footprints)} LEDs...")
+    place_cells(led_footprints, cells)
 
 
 def place_8lane_serpentine(led_footprints):
@@ -102,38 +149,28 @@ def place_8lane_serpentine(led_footprints):
     print(f"  Each lane: {COLS_PER_LANE} columns × {ROWS} rows")
     print(f"  LEDs rotated 180° on odd rows for better routing")
 
-    for idx, (led_num, fp) in enumerate(led_footprints):
+    cells = []
+    for idx in range(len(led_footprints)):
         # Determine which lane this LED belongs to
         lane = (idx // PIXELS_PER_LANE) % LANES
         pixel_in_lane = idx % PIXELS_PER_LANE
 
         # Within the lane, calculate row and column
-        row = pixel_in_lane // COLS_PER_LANE
-        col_in_lane = pixel_in_lane % COLS_PER_LANE
+        row, col_in_lane = divmod(pixel_in_lane, COLS_PER_LANE)
 
         # Serpentine: reverse direction on odd rows
-        if row % 2 == 1:
+        if row & 1:
             col_in_lane = COLS_PER_LANE - 1 - col_in_lane
 
         # Global column position
-        col = lane * COLS_PER_LANE + col_in_lane
-
-        # Calculate physical position
-        x_mm = START_X + (col * PITCH_X)
-        y_mm = START_Y + (row * PITCH_Y)
-
-        set_footprint_position(fp, x_mm, y_mm, row)
-
-        if (idx + 1) % 100 == 0:
-            print(f"  Placed {idx + 1}/{len(led_footprints)} LEDs...")
+        cells.append((row, lane * COLS_PER_LANE + col_in_lane))
 
+    place_cells(led_footprints, cells)
 
-def set_footprint_position(fp, x_mm, y_mm, row=None):
-    """Set footprint position and rotation"""
-    x_nm = pcbnew.FromMM(x_mm)
-    y_nm = pcbnew.FromMM(y_mm)
 
-    fp.SetPosition(pcbnew.VECTOR2I(x_nm, y_nm))
+def set_footprint_position(fp, x_nm, y_nm, row=None):
+    """Set footprint position (KiCad internal units) and rotation"""
+    fp.SetPosition(_VECTOR2I(x_nm, y_nm))
 
     # For serpentine: rotate LEDs 180° on odd rows
     # This aligns DOUT→DIN connections naturally
@@ -155,8 +192,8 @@ def place_led_matrix():
     total_leds = COLS * ROWS
     if len(led_footprints) != total_leds:
         print(f"Warning: Found {len(led_footprints)} LEDs, expected {total_leds}")
-        response = input(f"Continue anyway? (y/n): ")
-        if response.lower() != 'y':
+        if not ALLOW_MISMATCH:
+            print("Aborted. Set LED_ALLOW_MISMATCH=1 to place them anyway.")
             return
 
     print(f"\nPlacing {len(led_footprints)} LEDs in {COLS}×{ROWS} matrix")
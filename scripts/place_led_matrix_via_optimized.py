@@ -22,6 +22,8 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/place_led_matrix_via_optimized.py').read())
 """
 
+import os
+
 import pcbnew
 
 # Matrix configuration
@@ -41,6 +43,19 @@ START_Y = 10.0  # mm
 # LED reference prefix
 LED_PREFIX = "D"
 
+# Placement aborts when the LED count doesn't match COLS × ROWS; set the
+# environment variable LED_ALLOW_MISMATCH=1 to place the LEDs found anyway
+ALLOW_MISMATCH = os.environ.get("LED_ALLOW_MISMATCH", "0") == "1"
+
+# LEDs placed between progress messages
+PROGRESS_CHUNK = 128
+
+# KiCad internal unit is fixed at 1 nm (pcbnew.FromMM(1.0) == 1000000)
+MM_TO_NM = 1_000_000
+
+# perf: resolved once; set_footprint_position runs for every placed LED
+_VECTOR2I = pcbnew.VECTOR2I
+
 # ===== ROTATION CONFIGURATION =====
 # These rotations create the 2×2 VIA-optimized block pattern
 # Adjust these values based on your footprint's standard orientation
@@ -63,34 +78,87 @@ BLOCK_ROTATIONS = {
     (False, False):  90,   # Bottom-right: pins 3,1 / 4,2 → VDD/GND face left+up
 }
 
+# BLOCK_ROTATIONS flattened into a list indexed by ((col & 1) << 1) | (row & 1)
+ROT_TABLE = [
+    BLOCK_ROTATIONS[(col_odd == 0, row_odd == 0)]
+    for col_odd in (0, 1)
+    for row_odd in (0, 1)
+]
+
+
+def mm_to_nm(mm):
+    """Convert mm to KiCad internal units without a pcbnew call"""
+    return int(round(mm * MM_TO_NM))
+
 
 def get_led_footprints(board):
     """Get all LED footprints sorted by reference number"""
-    footprints = board.GetFootprints()
-    led_footprints = []
+    # Bucket LEDs straight into their slot by reference number (no sort);
+    # only out-of-range or duplicate numbers fall back to sorting
+    slots = [None] * (COLS * ROWS)
+    overflow = []
 
-    for fp in footprints:
+    for fp in board.GetFootprints():
         ref = fp.GetReference()
         if ref.startswith(LED_PREFIX):
             try:
                 num = int(ref[len(LED_PREFIX):])
-                led_footprints.append((num, fp))
             except ValueError:
                 print(f"Warning: Could not parse number from {ref}")
+                continue
+
+            if 1 <= num <= len(slots) and slots[num - 1] is None:
+                slots[num - 1] = (num, fp)
+            else:
+                overflow.append((num, fp))
 
-    led_footprints.sort(key=lambda x: x[0])
+    led_footprints = [entry for entry in slots if entry is not None]
+    if overflow:
+        led_footprints.extend(overflow)
+        led_footprints.sort(key=lambda x: x[0])
     return led_footprints
 
 
-def get_via_optimized_rotation(col, row):
+def compute_placements(count, start_x, start_y, pitch_x, pitch_y, cols, rows_per_lane, rot_table):
     """
-    Calculate LED rotation based on position in 2×2 block
-    Returns rotation in degrees
+    Pure placement kernel: (x_nm, y_nm, rotation) for the first `count` LEDs
+    in data order. Depends only on its arguments (no pcbnew, no module
+    globals).
+    The serpentine walk is identical in every lane, so it is built once as a
+    lane-local (row_in_lane, col) table and only offset by lane afterwards.
     """
-    col_even = (col % 2) == 0
-    row_even = (row % 2) == 0
+    pixels_per_lane = rows_per_lane * cols
+
+    # Lane-local serpentine: left-to-right on even rows, right-to-left on odd
+    lane_cells = []
+    for row_in_lane in range(rows_per_lane):
+        lane_cols = range(cols - 1, -1, -1) if row_in_lane & 1 else range(cols)
+        lane_cells.extend((row_in_lane, col) for col in lane_cols)
+
+    # Convert origin and pitch to KiCad internal units once; every position
+    # is then integer math on precomputed column offsets
+    start_x_nm = mm_to_nm(start_x)
+    start_y_nm = mm_to_nm(start_y)
+    pitch_x_nm = mm_to_nm(pitch_x)
+    pitch_y_nm = mm_to_nm(pitch_y)
+    col_x_nm = [start_x_nm + col * pitch_x_nm for col in range(cols)]
+
+    placements = []
+    for idx in range(count):
+        # Determine which data lane this LED belongs to
+        lane, pixel_in_lane = divmod(idx, pixels_per_lane)
+        row_in_lane, col = lane_cells[pixel_in_lane]
 
-    return BLOCK_ROTATIONS.get((col_even, row_even), 0)
+        # Global row position (lane offset + row within lane)
+        row = lane * rows_per_lane + row_in_lane
+
+        placements.append((
+            col_x_nm[col],
+            start_y_nm + row * pitch_y_nm,
+            rot_table[((col & 1) << 1) | (row & 1)],
+        ))
+
+    return placements
 
 
 def place_8lane_serpentine_via_optimized(led_footprints):
@@ -109,42 +177,25 @@ def place_8lane_serpentine_via_optimized(led_footprints):
     print(f"  Each lane: {ROWS_PER_LANE} rows × {COLS} columns")
     print(f"  2×2 block rotations for shared center VIAs\n")
 
-    for idx, (led_num, fp) in enumerate(led_footprints):
-        # Determine which data lane this LED belongs to
-        lane = idx // PIXELS_PER_LANE
-        pixel_in_lane = idx % PIXELS_PER_LANE
-
-        # Within the lane, calculate row and column
-        row_in_lane = pixel_in_lane // COLS
-        col = pixel_in_lane % COLS
-
-        # Serpentine: reverse direction on odd rows within each lane
-        if row_in_lane % 2 == 1:
-            col = COLS - 1 - col
-
-        # Global row position (lane offset + row within lane)
-        row = lane * ROWS_PER_LANE + row_in_lane
-
-        # Calculate physical position
-        x_mm = START_X + (col * PITCH_X)
-        y_mm = START_Y + (row * PITCH_Y)
-
-        # Get rotation for VIA optimization
-        rotation = get_via_optimized_rotation(col, row)
-
-        # Set position and rotation
-        set_footprint_position(fp, x_mm, y_mm, rotation)
+    placements = compute_placements(len(led_footprints), START_X, START_Y, PITCH_X, PITCH_Y,
+                                    COLS, ROWS_PER_LANE, ROT_TABLE)
 
-        if (idx + 1) % 100 == 0:
-            print(f"  Placed {idx + 1}/{len(led_footprints)} LEDs...")
+    # Place in fixed-size chunks and report progress between chunks, so the
+    # inner loop carries no per-LED progress check
+    total = len(led_footprints)
+    for start in range(0, total, PROGRESS_CHUNK):
+        end = min(start + PROGRESS_CHUNK, total)
+        for (led_num, fp), (x_nm, y_nm, rotation) in zip(led_footprints[start:end],
+                                                         placements[start:end]):
+            # Set position and rotation
+            set_footprint_position(fp, x_nm, y_nm, rotation)
 
+        print(f"  Placed {end}/{total} LEDs...")
 
-def set_footprint_position(fp, x_mm, y_mm, rotation=0):
-    """Set footprint position and rotation"""
-    x_nm = pcbnew.FromMM(x_mm)
-    y_nm = pcbnew.FromMM(y_mm)
 
-    fp.SetPosition(pcbnew.VECTOR2I(x_nm, y_nm))
+def set_footprint_position(fp, x_nm, y_nm, rotation=0):
+    """Set footprint position (KiCad internal units) and rotation"""
+    fp.SetPosition(_VECTOR2I(x_nm, y_nm))
 
     # Always set rotation to ensure consistent orientation
     fp.SetOrientationDegrees(rotation)
@@ -159,8 +210,8 @@ def place_led_matrix():
     total_leds = COLS * ROWS
     if len(led_footprints) != total_leds:
         print(f"Warning: Found {len(led_footprints)} LEDs, expected {total_leds}")
-        response = input(f"Continue anyway? (y/n): ")
-        if response.lower() != 'y':
+        if not ALLOW_MISMATCH:
+            print("Aborted. Set LED_ALLOW_MISMATCH=1 to place them anyway.")
             return
 
     print(f"\nPlacing {len(led_footprints)} LEDs in VIA-optimized pattern")
@@ -39,32 +39,45 @@ VIA_OFFSET_Y = PITCH_Y / 2  # Half pitch to center between LEDs
 VDD_NET_NAME = "VDD"
 GND_NET_NAME = "GND"
 
+# perf: resolved once; create_via runs once per VIA in the grid
+_VECTOR2I = pcbnew.VECTOR2I
 
-def create_via(board, x_mm, y_mm, net_name=None):
-    """Create a via at the specified position"""
-    x_nm = pcbnew.FromMM(x_mm)
-    y_nm = pcbnew.FromMM(y_mm)
 
+def create_via(board, x_nm, y_nm, drill_nm, size_nm, layers, net=None):
+    """Create a via at the specified position (not yet added to the board)"""
     via = pcbnew.PCB_VIA(board)
-    via.SetPosition(pcbnew.VECTOR2I(x_nm, y_nm))
-    via.SetDrill(pcbnew.FromMM(VIA_DRILL))
-    via.SetWidth(pcbnew.FromMM(VIA_SIZE))
-
-    # Set layers (through-hole via)
-    via.SetLayerPair(board.GetLayerID("F.Cu"), board.GetLayerID("B.Cu"))
-
-    # Assign net if specified
-    if net_name:
-        netinfo = board.FindNet(net_name)
-        if netinfo and netinfo.GetNetname() == net_name:
-            via.SetNet(netinfo)
-        else:
-            print(f"  Warning: Net '{net_name}' not found, VIA created without net assignment")
-
-    board.Add(via)
+    via.SetPosition(_VECTOR2I(x_nm, y_nm))
+    via.SetDrill(drill_nm)
+    via.SetWidth(size_nm)
+
+    # Set layers (through-hole via, layer IDs looked up once by the caller)
+    via.SetLayerPair(*layers)
+
+    # Assign net if specified (resolved once by the caller, not per VIA)
+    if net:
+        via.SetNet(net)
+
     return via
 
 
+def add_items(board, items, message):
+    """
+    Add items to the board in one batch.
+    Uses a single BOARD_COMMIT (one connectivity/undo update) when the pcbnew
+    bindings expose it, otherwise falls back to board.Add per item.
+    """
+    commit_class = getattr(pcbnew, "BOARD_COMMIT", None)
+    if commit_class is None:
+        for item in items:
+            board.Add(item)
+        return
+
+    commit = commit_class(board)
+    for item in items:
+        commit.Add(item)
+    commit.Push(message)
+
+
 def place_power_vias():
     """Place VIAs in the center of each 2×2 LED block"""
     board = pcbnew.GetBoard()
@@ -87,29 +100,42 @@ def place_power_vias():
         print(f"✓ Found net: {GND_NET_NAME}")
     else:
         print(f"⚠ Warning: Net '{GND_NET_NAME}' not found - VIAs will be created without net assignment")
+        gnd_net = None
 
     if vdd_net and vdd_net.GetNetname() == VDD_NET_NAME:
         print(f"✓ Found net: {VDD_NET_NAME}")
 
     print()
 
-    vias_placed = 0
-
-    # Place VIAs in grid
-    for via_row in range(via_rows):
-        for via_col in range(via_cols):
-            # Calculate VIA position (center of 2×2 LED block)
-            # VIA goes between LEDs at positions (2*col, 2*col+1) and (2*row, 2*row+1)
-            via_x = START_X + (via_col * 2 * PITCH_X) + VIA_OFFSET_X
-            via_y = START_Y + (via_row * 2 * PITCH_Y) + VIA_OFFSET_Y
-
+    # VIA geometry and layers are the same for every VIA; look up once
+    drill_nm = pcbnew.FromMM(VIA_DRILL)
+    size_nm = pcbnew.FromMM(VIA_SIZE)
+    layers = (board.GetLayerID("F.Cu"), board.GetLayerID("B.Cu"))
+
+    # VIA grid coordinates (center of each 2×2 LED block), precomputed per
+    # axis in internal units: one conversion per scalar, then integer math.
+    # VIA goes between LEDs at positions (2*col, 2*col+1) and (2*row, 2*row+1)
+    first_x_nm = pcbnew.FromMM(START_X + VIA_OFFSET_X)
+    first_y_nm = pcbnew.FromMM(START_Y + VIA_OFFSET_Y)
+    step_x_nm = pcbnew.FromMM(2 * PITCH_X)
+    step_y_nm = pcbnew.FromMM(2 * PITCH_Y)
+    via_xs = [first_x_nm + via_col * step_x_nm for via_col in range(via_cols)]
+    via_ys = [first_y_nm + via_row * step_y_nm for via_row in range(via_rows)]
+
+    # Phase 1: build all VIA objects
+    vias = []
+    for via_y in via_ys:
+        for via_x in via_xs:
             # Assign all VIAs to GND by default
             # You can manually change some to VDD in KiCad after placement
-            create_via(board, via_x, via_y, net_name=GND_NET_NAME if gnd_net else None)
-            vias_placed += 1
+            vias.append(create_via(board, via_x, via_y, drill_nm, size_nm, layers, net=gnd_net))
+
+    # Nothing reaches the board until the commit, so report once per phase
+    print(f"  Created {len(vias)}/{total_vias} VIAs")
 
-            if vias_placed % 100 == 0:
-                print(f"  Placed {vias_placed}/{total_vias} VIAs...")
+    # Phase 2: add them to the board in a single commit
+    add_items(board, vias, "Place power vias")
+    vias_placed = len(vias)
 
     # Report results
     via_area_width = (via_cols - 1) * 2 * PITCH_X
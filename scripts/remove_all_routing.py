@@ -7,10 +7,37 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/remove_all_routing.py').read())
 """
 
+import sys
+
 import pcbnew
 
-def remove_all_routing():
-    """Remove all tracks and vias from the board"""
+def remove_items(board, items, message):
+    """
+    Remove items from the board in one batch.
+    Uses a single BOARD_COMMIT (connectivity/undo updated once) when the
+    pcbnew bindings expose it, otherwise falls back to board.Remove per item.
+    """
+    commit_class = getattr(pcbnew, "BOARD_COMMIT", None)
+    if commit_class is None:
+        for item in items:
+            board.Remove(item)
+        return
+
+    commit = commit_class(board)
+    for item in items:
+        commit.Remove(item)
+    commit.Push(message)
+
+def is_interactive():
+    """True when stdin is a terminal (the KiCad console is); piped/headless runs are not"""
+    isatty = getattr(sys.stdin, "isatty", None)
+    return bool(isatty and isatty())
+
+def remove_all_routing(confirm=None):
+    """
+    Remove all tracks and vias from the board
+    confirm: prompt before removing; None prompts only when stdin is a terminal
+    """
     board = pcbnew.GetBoard()
 
     print("Scanning for tracks and vias...")
@@ -19,11 +46,18 @@ def remove_all_routing():
     tracks_to_remove = []
     vias_to_remove = []
 
+    # Bind type constants and appends locally; Type() is called once per item
+    VIA_T = pcbnew.PCB_VIA_T
+    TRACE_T = pcbnew.PCB_TRACE_T
+    add_track = tracks_to_remove.append
+    add_via = vias_to_remove.append
+
     for item in board.GetTracks():
-        if item.Type() == pcbnew.PCB_VIA_T:
-            vias_to_remove.append(item)
-        elif item.Type() == pcbnew.PCB_TRACE_T:
-            tracks_to_remove.append(item)
+        item_type = item.Type()
+        if item_type == VIA_T:
+            add_via(item)
+        elif item_type == TRACE_T:
+            add_track(item)
 
     print(f"Found {len(tracks_to_remove)} tracks")
     print(f"Found {len(vias_to_remove)} vias")
@@ -35,38 +69,22 @@ def remove_all_routing():
         return
 
     print(f"\nThis will remove ALL routing from the board!")
-    response = input(f"Remove all {total} items? (y/n): ")
-    if response.lower() != 'y':
-        print("Cancelled")
-        return
+    if confirm is None:
+        confirm = is_interactive()
+    if confirm:
+        response = input(f"Remove all {total} items? (y/n): ")
+        if response.lower() != 'y':
+            print("Cancelled")
+            return
+
+    # Remove all tracks and vias in a single batch
+    print(f"\nRemoving {len(tracks_to_remove)} tracks and {len(vias_to_remove)} vias...")
+    remove_items(board, tracks_to_remove + vias_to_remove, "Remove all routing")
 
-    # Remove all tracks
     if len(tracks_to_remove) > 0:
-        print(f"\nRemoving {len(tracks_to_remove)} tracks...")
-        removed_count = 0
-
-        for track in tracks_to_remove:
-            board.Remove(track)
-            removed_count += 1
-
-            if removed_count % 1000 == 0:
-                print(f"  Removed {removed_count}/{len(tracks_to_remove)} tracks...")
-
-        print(f"✓ Removed {removed_count} tracks")
-
-    # Remove all vias
+        print(f"✓ Removed {len(tracks_to_remove)} tracks")
     if len(vias_to_remove) > 0:
-        print(f"\nRemoving {len(vias_to_remove)} vias...")
-        removed_count = 0
-
-        for via in vias_to_remove:
-            board.Remove(via)
-            removed_count += 1
-
-            if removed_count % 1000 == 0:
-                print(f"  Removed {removed_count}/{len(vias_to_remove)} vias...")
-
-        print(f"✓ Removed {removed_count} vias")
+        print(f"✓ Removed {len(vias_to_remove)} vias")
 
     print(f"\n✓ Successfully removed all routing ({total} items total)")
 
@@ -7,20 +7,45 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/remove_all_vias.py').read())
 """
 
+import sys
+
 import pcbnew
 
-def remove_all_vias():
-    """Remove all vias from the board"""
+def remove_items(board, items, message):
+    """
+    Remove items from the board in one batch.
+    Uses a single BOARD_COMMIT (connectivity/undo updated once) when the
+    pcbnew bindings expose it, otherwise falls back to board.Remove per item.
+    """
+    commit_class = getattr(pcbnew, "BOARD_COMMIT", None)
+    if commit_class is None:
+        for item in items:
+            board.Remove(item)
+        return
+
+    commit = commit_class(board)
+    for item in items:
+        commit.Remove(item)
+    commit.Push(message)
+
+def is_interactive():
+    """True when stdin is a terminal (the KiCad console is); piped/headless runs are not"""
+    isatty = getattr(sys.stdin, "isatty", None)
+    return bool(isatty and isatty())
+
+def remove_all_vias(confirm=None):
+    """
+    Remove all vias from the board
+    confirm: prompt before removing; None prompts only when stdin is a terminal
+    """
     board = pcbnew.GetBoard()
 
     print("Scanning for vias...")
 
     # Collect all vias first (don't modify while iterating)
-    vias_to_remove = []
-
-    for item in board.GetTracks():
-        if item.Type() == pcbnew.PCB_VIA_T:
-            vias_to_remove.append(item)
+    # Bind the type constant locally so the scan loop skips module lookups
+    VIA_T = pcbnew.PCB_VIA_T
+    vias_to_remove = [item for item in board.GetTracks() if item.Type() == VIA_T]
 
     print(f"Found {len(vias_to_remove)} vias to remove")
 
@@ -28,23 +53,19 @@ def remove_all_vias():
         print("No vias found on board")
         return
 
-    response = input(f"Remove all {len(vias_to_remove)} vias? (y/n): ")
-    if response.lower() != 'y':
-        print("Cancelled")
-        return
+    if confirm is None:
+        confirm = is_interactive()
+    if confirm:
+        response = input(f"Remove all {len(vias_to_remove)} vias? (y/n): ")
+        if response.lower() != 'y':
+            print("Cancelled")
+            return
 
-    # Remove all vias
+    # Remove all vias in a single batch
     print("Removing vias...")
-    removed_count = 0
-
-    for via in vias_to_remove:
-        board.Remove(via)
-        removed_count += 1
-
-        if removed_count % 1000 == 0:
-            print(f"  Removed {removed_count}/{len(vias_to_remove)} vias...")
+    remove_items(board, vias_to_remove, "Remove all vias")
 
-    print(f"\n✓ Successfully removed {removed_count} vias")
+    print(f"\n✓ Successfully removed {len(vias_to_remove)} vias")
 
     # Refresh board
     pcbnew.Refresh()
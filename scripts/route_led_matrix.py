@@ -7,6 +7,9 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/route_led_matrix.py').read())
 """
 
+import sys
+from operator import itemgetter
+
 import pcbnew
 
 # Matrix configuration (must match placement script)
@@ -22,6 +25,11 @@ TRACE_WIDTH = 0.15  # mm (adjust based on fab capabilities)
 VIA_DRILL = 0.3     # mm
 VIA_SIZE = 0.6      # mm
 
+# Routing dimensions in KiCad internal units, converted once at load
+TRACE_WIDTH_NM = pcbnew.FromMM(TRACE_WIDTH)
+VIA_DRILL_NM = pcbnew.FromMM(VIA_DRILL)
+VIA_SIZE_NM = pcbnew.FromMM(VIA_SIZE)
+
 # Layer definitions
 LAYER_TOP = pcbnew.F_Cu
 LAYER_BOTTOM = pcbnew.B_Cu
@@ -35,44 +43,61 @@ COLS_PER_LANE = COLS // LANES  # 8 columns per lane
 PIXELS_PER_LANE = COLS_PER_LANE * ROWS  # 320 pixels per lane
 
 
-def get_pad_position(footprint, pad_name):
-    """Get the absolute position of a specific pad on a footprint"""
-    for pad in footprint.Pads():
-        if pad.GetName() == pad_name:
-            return pad.GetPosition()
-    return None
+def build_pad_positions(led_footprints):
+    """
+    Read every LED pad position once: pad_positions[idx][pad_name] -> VECTOR2I.
+    Routing then works from this table instead of calling back into pcbnew
+    for each pad it touches.
+    """
+    return [
+        {pad.GetName(): pad.GetPosition() for pad in fp.Pads()}
+        for num, fp in led_footprints
+    ]
+
+
+def begin_commit(board):
+    """
+    Open a BOARD_COMMIT so every new track/via lands in one batch with a
+    single connectivity/undo update. Falls back to the board itself (same
+    Add interface) when the pcbnew bindings don't expose BOARD_COMMIT.
+    """
+    commit_class = getattr(pcbnew, "BOARD_COMMIT", None)
+    return commit_class(board) if commit_class else board
 
 
-def create_track(board, start_pos, end_pos, width_mm, layer):
+def push_commit(board, commit, message):
+    """
+    Apply a batch opened with begin_commit. On the board.Add fallback,
+    connectivity (ratsnest) is rebuilt once here for the whole batch.
+    """
+    if commit is not board:
+        commit.Push(message)
+    elif hasattr(board, "BuildConnectivity"):
+        board.BuildConnectivity()
+
+
+def create_track(board, commit, start_pos, end_pos, width_nm, layer):
     """Create a track between two points"""
     track = pcbnew.PCB_TRACK(board)
     track.SetStart(start_pos)
     track.SetEnd(end_pos)
-    track.SetWidth(pcbnew.FromMM(width_mm))
+    track.SetWidth(width_nm)
     track.SetLayer(layer)
-    board.Add(track)
+    commit.Add(track)
     return track
 
 
-def create_via(board, position, drill_mm, size_mm):
+def create_via(board, commit, position, drill_nm, size_nm):
     """Create a via at the specified position"""
     via = pcbnew.PCB_VIA(board)
     via.SetPosition(position)
-    via.SetDrill(pcbnew.FromMM(drill_mm))
-    via.SetWidth(pcbnew.FromMM(size_mm))
-    board.Add(via)
+    via.SetDrill(drill_nm)
+    via.SetWidth(size_nm)
+    commit.Add(via)
     return via
 
 
-def get_footprint_by_ref(board, reference):
-    """Get footprint by reference designator"""
-    for fp in board.GetFootprints():
-        if fp.GetReference() == reference:
-            return fp
-    return None
-
-
-def route_data_lanes(board, led_footprints):
+def route_data_lanes(board, led_footprints, pad_positions):
     """
     Route data traces for 8-lane serpentine pattern
     Connects DOUT of each LED to DIN of next LED in chain
@@ -88,29 +113,27 @@ def route_data_lanes(board, led_footprints):
     PAD_DOUT = "1"
 
     tracks_created = 0
+    commit = begin_commit(board)
 
     for lane in range(LANES):
         print(f"  Routing lane {lane + 1}/{LANES}...")
 
-        # Route each lane's chain
-        for pixel_in_lane in range(PIXELS_PER_LANE - 1):
-            # Calculate LED index in the overall array
-            led_idx = lane * PIXELS_PER_LANE + pixel_in_lane
-
-            if led_idx >= len(led_footprints):
-                break
-
-            # Current LED (DOUT) -> Next LED (DIN)
-            current_led_num, current_fp = led_footprints[led_idx]
-            next_led_num, next_fp = led_footprints[led_idx + 1]
+        # Slice out this lane's LEDs (and their pads) once, then walk
+        # neighbouring pairs: current LED (DOUT) -> next LED (DIN)
+        lane_start = lane * PIXELS_PER_LANE
+        lane_end = lane_start + PIXELS_PER_LANE
+        lane_fps = led_footprints[lane_start:lane_end]
+        lane_pads = pad_positions[lane_start:lane_end]
 
+        for (current_led_num, _), (next_led_num, _), current_pads, next_pads in zip(
+                lane_fps, lane_fps[1:], lane_pads, lane_pads[1:]):
             # Get pad positions
-            dout_pos = get_pad_position(current_fp, PAD_DOUT)
-            din_pos = get_pad_position(next_fp, PAD_DIN)
+            dout_pos = current_pads.get(PAD_DOUT)
+            din_pos = next_pads.get(PAD_DIN)
 
             if dout_pos and din_pos:
                 # Create direct track (for now - may need vias/dogleg for complex routing)
-                create_track(board, dout_pos, din_pos, TRACE_WIDTH, LAYER_TOP)
+                create_track(board, commit, dout_pos, din_pos, TRACE_WIDTH_NM, LAYER_TOP)
                 tracks_created += 1
             else:
                 print(f"    Warning: Could not find pads for {LED_PREFIX}{current_led_num} -> {LED_PREFIX}{next_led_num}")
@@ -118,11 +141,13 @@ def route_data_lanes(board, led_footprints):
         if (lane + 1) % 2 == 0:
             print(f"    Created {tracks_created} tracks so far...")
 
+    push_commit(board, commit, "Route LED data lanes")
+
     print(f"\n✓ Created {tracks_created} data traces")
     return tracks_created
 
 
-def route_power_vias(board, led_footprints, add_vias=False):
+def route_power_vias(board, led_footprints, pad_positions, add_vias=False):
     """
     Add vias from power pads to internal planes
     Set add_vias=True to actually create the vias
@@ -138,24 +163,24 @@ def route_power_vias(board, led_footprints, add_vias=False):
 
     print("\nAdding power vias to planes...")
     vias_created = 0
+    commit = begin_commit(board)
 
     for idx, (led_num, fp) in enumerate(led_footprints):
         # Get VDD and GND pad positions
-        vdd_pos = get_pad_position(fp, PAD_VDD)
-        gnd_pos = get_pad_position(fp, PAD_GND)
+        vdd_pos = pad_positions[idx].get(PAD_VDD)
+        gnd_pos = pad_positions[idx].get(PAD_GND)
 
         # Add via at VDD pad (connects to Layer 3 power plane)
         if vdd_pos:
-            create_via(board, vdd_pos, VIA_DRILL, VIA_SIZE)
+            create_via(board, commit, vdd_pos, VIA_DRILL_NM, VIA_SIZE_NM)
             vias_created += 1
 
         # Add via at GND pad (connects to Layer 2 ground plane)
         if gnd_pos:
-            create_via(board, gnd_pos, VIA_DRILL, VIA_SIZE)
+            create_via(board, commit, gnd_pos, VIA_DRILL_NM, VIA_SIZE_NM)
             vias_created += 1
 
-        if (idx + 1) % 500 == 0:
-            print(f"  Added {vias_created} vias so far...")
+    push_commit(board, commit, "Add LED power vias")
 
     print(f"\n✓ Created {vias_created} power vias")
     return vias_created
@@ -171,12 +196,12 @@ def print_power_routing_instructions():
     print("  5. Optionally add via stitching for lower impedance")
 
 
-def verify_footprint_pads(board):
+def verify_footprint_pads(fp_by_ref):
     """Verify LED footprint pad configuration"""
     print("\nVerifying LED footprint pad configuration...")
 
     # Get first LED to check pad names
-    first_led = get_footprint_by_ref(board, f"{LED_PREFIX}1")
+    first_led = fp_by_ref.get(f"{LED_PREFIX}1")
     if not first_led:
         print(f"  Error: Could not find {LED_PREFIX}1")
         return False
@@ -192,42 +217,53 @@ def verify_footprint_pads(board):
     return True
 
 
-def main():
-    """Main routing function"""
-    board = pcbnew.GetBoard()
+def is_interactive():
+    """True when stdin is a terminal (the KiCad console is); piped/headless runs are not"""
+    isatty = getattr(sys.stdin, "isatty", None)
+    return bool(isatty and isatty())
 
-    # Verify footprint configuration
-    if not verify_footprint_pads(board):
-        return
 
-    response = input("\nDo the pad numbers look correct? Continue with routing? (y/n): ")
-    if response.lower() != 'y':
-        print("Aborted. Please update PAD_DIN and PAD_DOUT in the script.")
-        return
+def main(confirm=None):
+    """
+    Main routing function
+    confirm: prompt before routing; None prompts only when stdin is a terminal
+    """
+    board = pcbnew.GetBoard()
 
-    # Get LED footprints (same as placement script)
-    footprints = board.GetFootprints()
+    # Index footprints by reference and collect LEDs in a single pass
+    fp_by_ref = {}
     led_footprints = []
 
-    for fp in footprints:
+    for fp in board.GetFootprints():
         ref = fp.GetReference()
-        if ref.startswith(LED_PREFIX):
-            try:
-                num = int(ref[len(LED_PREFIX):])
-                led_footprints.append((num, fp))
-            except ValueError:
-                pass
+        fp_by_ref[ref] = fp
+        suffix = ref[len(LED_PREFIX):]
+        if ref.startswith(LED_PREFIX) and suffix.isdigit():
+            led_footprints.append((int(suffix), fp))
+
+    # Verify footprint configuration
+    if not verify_footprint_pads(fp_by_ref):
+        return
+
+    if confirm is None:
+        confirm = is_interactive()
+    if confirm:
+        response = input("\nDo the pad numbers look correct? Continue with routing? (y/n): ")
+        if response.lower() != 'y':
+            print("Aborted. Please update PAD_DIN and PAD_DOUT in the script.")
+            return
 
-    led_footprints.sort(key=lambda x: x[0])
+    led_footprints.sort(key=itemgetter(0))
+    pad_positions = build_pad_positions(led_footprints)
 
     print(f"\nFound {len(led_footprints)} LEDs")
 
     # Route data lanes
-    route_data_lanes(board, led_footprints)
+    route_data_lanes(board, led_footprints, pad_positions)
 
     # Power vias (DISABLED - not needed with copper pours!)
     # DO NOT ENABLE - use copper zones on In1.Cu and In2.Cu instead
-    route_power_vias(board, led_footprints, add_vias=False)
+    route_power_vias(board, led_footprints, pad_positions, add_vias=False)
 
     # Power routing instructions
     print_power_routing_instructions()
@@ -7,6 +7,9 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/route_led_matrix_bottom_layer.py').read())
 """
 
+import sys
+from operator import itemgetter
+
 import pcbnew
 
 # Matrix configuration
@@ -19,45 +22,76 @@ TRACE_WIDTH = 0.08   # mm (narrower for tighter clearance)
 VIA_DRILL = 0.3     # mm
 VIA_SIZE = 0.6      # mm
 
+# Routing dimensions in KiCad internal units, converted once at load
+TRACE_WIDTH_NM = pcbnew.FromMM(TRACE_WIDTH)
+VIA_DRILL_NM = pcbnew.FromMM(VIA_DRILL)
+VIA_SIZE_NM = pcbnew.FromMM(VIA_SIZE)
+
 # Layers
 LAYER_TOP = pcbnew.F_Cu
 LAYER_BOTTOM = pcbnew.B_Cu
 
+# perf: track/via classes bound once at load; the create_* helpers run
+# once per connection and otherwise resolve them on pcbnew every call
+_PCB_TRACK = pcbnew.PCB_TRACK
+_PCB_VIA = pcbnew.PCB_VIA
+
 
-def get_pad_by_number(footprint, pad_number):
-    """Get a specific pad object from footprint"""
-    for pad in footprint.Pads():
-        if pad.GetName() == str(pad_number):
-            return pad
-    return None
+def build_pad_index(led_footprints):
+    """
+    Map every LED's pads by name in one pass: pad_index[idx][pad_name] -> pad.
+    Routing then looks pads up in O(1) instead of scanning fp.Pads() per use.
+    """
+    return [{pad.GetName(): pad for pad in fp.Pads()} for num, fp in led_footprints]
+
+
+def begin_commit(board):
+    """
+    Open a BOARD_COMMIT so every new track/via lands in one batch with a
+    single connectivity/undo update. Falls back to the board itself (same
+    Add interface) when the pcbnew bindings don't expose BOARD_COMMIT.
+    """
+    commit_class = getattr(pcbnew, "BOARD_COMMIT", None)
+    return commit_class(board) if commit_class else board
 
 
-def create_track_with_net(board, start_pos, end_pos, width_mm, layer, net):
+def push_commit(board, commit, message):
+    """
+    Apply a batch opened with begin_commit. On the board.Add fallback,
+    connectivity (ratsnest) is rebuilt once here for the whole batch.
+    """
+    if commit is not board:
+        commit.Push(message)
+    elif hasattr(board, "BuildConnectivity"):
+        board.BuildConnectivity()
+
+
+def create_track_with_net(board, commit, start_pos, end_pos, width_nm, layer, net):
     """Create a track with proper net assignment"""
-    track = pcbnew.PCB_TRACK(board)
+    track = _PCB_TRACK(board)
     track.SetStart(start_pos)
     track.SetEnd(end_pos)
-    track.SetWidth(pcbnew.FromMM(width_mm))
+    track.SetWidth(width_nm)
     track.SetLayer(layer)
     if net:
         track.SetNet(net)
-    board.Add(track)
+    commit.Add(track)
     return track
 
 
-def create_via_with_net(board, position, drill_mm, size_mm, net):
+def create_via_with_net(board, commit, position, drill_nm, size_nm, net):
     """Create a via with proper net assignment"""
-    via = pcbnew.PCB_VIA(board)
+    via = _PCB_VIA(board)
     via.SetPosition(position)
-    via.SetDrill(pcbnew.FromMM(drill_mm))
-    via.SetWidth(pcbnew.FromMM(size_mm))
+    via.SetDrill(drill_nm)
+    via.SetWidth(size_nm)
     if net:
         via.SetNet(net)
-    board.Add(via)
+    commit.Add(via)
     return via
 
 
-def route_all_bottom_layer(board, led_footprints):
+def route_all_bottom_layer(board, led_footprints, pad_index):
     """
     Route ALL connections on bottom layer.
     The pads themselves provide the layer transition (through-hole plating).
@@ -65,19 +99,20 @@ def route_all_bottom_layer(board, led_footprints):
     """
     print("Routing ALL connections on bottom layer...")
 
-    PAD_DIN = 4
-    PAD_DOUT = 1
+    PAD_DIN = "4"
+    PAD_DOUT = "1"
 
     total_traces = 0
     errors = 0
+    commit = begin_commit(board)
 
     for idx in range(len(led_footprints) - 1):
         led_num, current_fp = led_footprints[idx]
         next_num, next_fp = led_footprints[idx + 1]
 
         # Get pads
-        dout_pad = get_pad_by_number(current_fp, PAD_DOUT)
-        din_pad = get_pad_by_number(next_fp, PAD_DIN)
+        dout_pad = pad_index[idx].get(PAD_DOUT)
+        din_pad = pad_index[idx + 1].get(PAD_DIN)
 
         if not dout_pad or not din_pad:
             print(f"  Warning: Missing pads for {LED_PREFIX}{led_num} -> {LED_PREFIX}{next_num}")
@@ -90,12 +125,10 @@ def route_all_bottom_layer(board, led_footprints):
 
         # Simple: Just trace on bottom layer between pads
         # The pads themselves connect top and bottom layers
-        create_track_with_net(board, dout_pos, din_pos, TRACE_WIDTH, LAYER_BOTTOM, net)
+        create_track_with_net(board, commit, dout_pos, din_pos, TRACE_WIDTH_NM, LAYER_BOTTOM, net)
         total_traces += 1
 
-        # Progress indicator
-        if (idx + 1) % 100 == 0:
-            print(f"  Routed {idx + 1}/{len(led_footprints)-1} connections...")
+    push_commit(board, commit, "Route LED matrix on bottom layer")
 
     print(f"\n✓ Created {total_traces} bottom-layer traces")
     print(f"  - No vias needed (pads provide layer connection)")
@@ -106,24 +139,29 @@ def route_all_bottom_layer(board, led_footprints):
     return total_traces
 
 
-def main():
-    """Main routing function"""
+def is_interactive():
+    """True when stdin is a terminal (the KiCad console is); piped/headless runs are not"""
+    isatty = getattr(sys.stdin, "isatty", None)
+    return bool(isatty and isatty())
+
+
+def main(confirm=None):
+    """
+    Main routing function
+    confirm: prompt before routing; None prompts only when stdin is a terminal
+    """
     board = pcbnew.GetBoard()
 
     # Get LED footprints
-    footprints = board.GetFootprints()
     led_footprints = []
 
-    for fp in footprints:
+    for fp in board.GetFootprints():
         ref = fp.GetReference()
-        if ref.startswith(LED_PREFIX):
-            try:
-                num = int(ref[len(LED_PREFIX):])
-                led_footprints.append((num, fp))
-            except ValueError:
-                pass
+        suffix = ref[len(LED_PREFIX):]
+        if ref.startswith(LED_PREFIX) and suffix.isdigit():
+            led_footprints.append((int(suffix), fp))
 
-    led_footprints.sort(key=lambda x: x[0])
+    led_footprints.sort(key=itemgetter(0))
 
     print(f"\nFound {len(led_footprints)} LEDs")
     print(f"Trace width: {TRACE_WIDTH}mm")
@@ -133,13 +171,16 @@ def main():
     print(f"  - Pads provide top↔bottom layer connection (no vias needed)")
     print(f"  - Expected: {len(led_footprints)-1} traces on bottom layer\n")
 
-    response = input("Start routing? (y/n): ")
-    if response.lower() != 'y':
-        print("Cancelled")
-        return
+    if confirm is None:
+        confirm = is_interactive()
+    if confirm:
+        response = input("Start routing? (y/n): ")
+        if response.lower() != 'y':
+            print("Cancelled")
+            return
 
     # Route everything on bottom
-    route_all_bottom_layer(board, led_footprints)
+    route_all_bottom_layer(board, led_footprints, build_pad_index(led_footprints))
 
     # Refresh board
     pcbnew.Refresh()
@@ -7,6 +7,9 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/route_led_matrix_smart.py').read())
 """
 
+import sys
+from operator import itemgetter
+
 import pcbnew
 
 # Matrix configuration
@@ -22,10 +25,20 @@ TRACE_WIDTH = 0.1   # mm - narrower for tight spacing
 VIA_DRILL = 0.3     # mm
 VIA_SIZE = 0.6      # mm
 
+# Routing dimensions in KiCad internal units, converted once at load
+TRACE_WIDTH_NM = pcbnew.FromMM(TRACE_WIDTH)
+VIA_DRILL_NM = pcbnew.FromMM(VIA_DRILL)
+VIA_SIZE_NM = pcbnew.FromMM(VIA_SIZE)
+
 # Layer definitions
 LAYER_TOP = pcbnew.F_Cu
 LAYER_BOTTOM = pcbnew.B_Cu
 
+# perf: track/via classes bound once at load; the create_* helpers run
+# once per connection and otherwise resolve them on pcbnew every call
+_PCB_TRACK = pcbnew.PCB_TRACK
+_PCB_VIA = pcbnew.PCB_VIA
+
 # LED prefix
 LED_PREFIX = "D"
 
@@ -35,153 +48,157 @@ COLS_PER_LANE = COLS // LANES
 PIXELS_PER_LANE = COLS_PER_LANE * ROWS
 
 
-def get_pad_by_number(footprint, pad_number):
-    """Get a specific pad object from footprint"""
-    for pad in footprint.Pads():
-        if pad.GetName() == str(pad_number):
-            return pad
-    return None
+def build_pad_index(led_footprints):
+    """
+    Map every LED's pads by name in one pass: pad_index[idx][pad_name] -> pad.
+    Routing then looks pads up in O(1) instead of scanning fp.Pads() per use.
+    """
+    return [{pad.GetName(): pad for pad in fp.Pads()} for num, fp in led_footprints]
+
+
+def begin_commit(board):
+    """
+    Open a BOARD_COMMIT so every new track/via lands in one batch with a
+    single connectivity/undo update. Falls back to the board itself (same
+    Add interface) when the pcbnew bindings don't expose BOARD_COMMIT.
+    """
+    commit_class = getattr(pcbnew, "BOARD_COMMIT", None)
+    return commit_class(board) if commit_class else board
+
+
+def push_commit(board, commit, message):
+    """
+    Apply a batch opened with begin_commit. On the board.Add fallback,
+    connectivity (ratsnest) is rebuilt once here for the whole batch.
+    """
+    if commit is not board:
+        commit.Push(message)
+    elif hasattr(board, "BuildConnectivity"):
+        board.BuildConnectivity()
 
 
-def create_track_with_net(board, start_pos, end_pos, width_mm, layer, net):
+def create_track_with_net(board, commit, start_pos, end_pos, width_nm, layer, net):
     """Create a track with proper net assignment"""
-    track = pcbnew.PCB_TRACK(board)
+    track = _PCB_TRACK(board)
     track.SetStart(start_pos)
     track.SetEnd(end_pos)
-    track.SetWidth(pcbnew.FromMM(width_mm))
+    track.SetWidth(width_nm)
     track.SetLayer(layer)
     if net:
         track.SetNet(net)
-    board.Add(track)
+    commit.Add(track)
     return track
 
 
-def create_via_with_net(board, position, drill_mm, size_mm, net):
+def create_via_with_net(board, commit, position, drill_nm, size_nm, net):
     """Create a via with proper net assignment"""
-    via = pcbnew.PCB_VIA(board)
+    via = _PCB_VIA(board)
     via.SetPosition(position)
-    via.SetDrill(pcbnew.FromMM(drill_mm))
-    via.SetWidth(pcbnew.FromMM(size_mm))
+    via.SetDrill(drill_nm)
+    via.SetWidth(size_nm)
     if net:
         via.SetNet(net)
-    board.Add(via)
+    commit.Add(via)
     return via
 
 
-def get_footprint_by_ref(board, reference):
-    """Get footprint by reference designator"""
-    for fp in board.GetFootprints():
-        if fp.GetReference() == reference:
-            return fp
-    return None
+def route_same_row(board, commit, start_pad, end_pad, width_nm):
+    """
+    Same row: simple horizontal routing on top layer.
+    With rotated LEDs, DOUT and DIN are naturally aligned.
+    Returns number of segments created.
+    """
+    create_track_with_net(board, commit, start_pad.GetPosition(), end_pad.GetPosition(),
+                          width_nm, LAYER_TOP, start_pad.GetNet())
+    return 1
 
 
-def route_with_via_if_needed(board, start_pad, end_pad, width_mm,
-                              current_row, current_col, next_row, next_col):
+def route_row_transition(board, commit, start_pad, end_pad, width_nm):
     """
-    Route between two pads, using vias and bottom layer only for row transitions.
-    With rotated LEDs on odd rows, most routing is simple horizontal traces.
+    Row transition (serpentine wrap): Use bottom layer to avoid obstacles.
+    This happens at the end of each row when wrapping to the next.
     Returns number of segments created.
     """
     start_pos = start_pad.GetPosition()
     end_pos = end_pad.GetPosition()
     net = start_pad.GetNet()
 
-    segments = 0
-
-    # Calculate routing distance
-    dx_mm = abs(pcbnew.ToMM(end_pos.x - start_pos.x))
-    dy_mm = abs(pcbnew.ToMM(end_pos.y - start_pos.y))
-
-    # Determine if this is a row transition (serpentine wrap-around)
-    is_row_transition = (current_row != next_row)
-
-    if not is_row_transition:
-        # Same row: simple horizontal routing on top layer
-        # With rotated LEDs, DOUT and DIN are naturally aligned
-        create_track_with_net(board, start_pos, end_pos, width_mm, LAYER_TOP, net)
-        segments += 1
+    # Via at start (top to bottom)
+    create_via_with_net(board, commit, start_pos, VIA_DRILL_NM, VIA_SIZE_NM, net)
 
-    else:
-        # Row transition (serpentine wrap): Use bottom layer to avoid obstacles
-        # This happens at the end of each row when wrapping to the next
+    # Track on bottom layer
+    create_track_with_net(board, commit, start_pos, end_pos, width_nm, LAYER_BOTTOM, net)
 
-        # Via at start (top to bottom)
-        create_via_with_net(board, start_pos, VIA_DRILL, VIA_SIZE, net)
-        segments += 1
+    # Via at end (bottom to top)
+    create_via_with_net(board, commit, end_pos, VIA_DRILL_NM, VIA_SIZE_NM, net)
 
-        # Track on bottom layer
-        create_track_with_net(board, start_pos, end_pos, width_mm, LAYER_BOTTOM, net)
-        segments += 1
+    return 3
 
-        # Via at end (bottom to top)
-        create_via_with_net(board, end_pos, VIA_DRILL, VIA_SIZE, net)
-        segments += 1
 
-    return segments
-
-
-def get_led_row_col(led_idx, serpentine=True):
+def compute_routing_plan(count, cols_per_lane, rows_per_lane):
     """
-    Calculate the row and column for an LED in serpentine pattern.
-    Returns (row, col) for the LED's physical position.
+    Pure routing-plan kernel for the first `count` LEDs in serpentine order.
+    Returns is_transition, indexed by LED index: is_transition[i] is True
+    when the connection i -> i+1 wraps to a new row.
+    Depends only on its arguments (no pcbnew, no module globals).
     """
-    # For 8-lane serpentine
-    lane = (led_idx // PIXELS_PER_LANE) % LANES
-    pixel_in_lane = led_idx % PIXELS_PER_LANE
-
-    row = pixel_in_lane // COLS_PER_LANE
-    col_in_lane = pixel_in_lane % COLS_PER_LANE
-
-    # Serpentine: reverse direction on odd rows
-    if serpentine and row % 2 == 1:
-        col_in_lane = COLS_PER_LANE - 1 - col_in_lane
+    pixels_per_lane = cols_per_lane * rows_per_lane
 
-    col = lane * COLS_PER_LANE + col_in_lane
+    # Serpentine only reverses the column direction on odd rows; an LED's
+    # row within its lane is the same either way, and the walk is the same
+    # in every lane, so only the row index is needed
+    rows = [(led_idx % pixels_per_lane) // cols_per_lane for led_idx in range(count)]
 
-    return (row, col)
+    return [current != following for current, following in zip(rows, rows[1:])]
 
 
-def route_data_lanes_smart(board, led_footprints):
+def route_data_lanes_smart(board, led_footprints, pad_index):
     """
     Smart routing with proper net assignment and via usage
     """
     print("Smart routing data traces with net assignment...")
 
-    PAD_DIN = 4
-    PAD_DOUT = 1
+    PAD_DIN = "4"
+    PAD_DOUT = "1"
 
     total_segments = 0
     errors = 0
+    commit = begin_commit(board)
 
-    # Route each connection
-    for idx in range(len(led_footprints) - 1):
-        led_num, current_fp = led_footprints[idx]
-        next_num, next_fp = led_footprints[idx + 1]
+    # Which connections wrap to a new row, planned up front
+    is_transition = compute_routing_plan(len(led_footprints), COLS_PER_LANE, ROWS)
 
+    # Resolve every connection's pads, split by whether it wraps to a new row
+    same_row = []
+    transitions = []
+    for idx in range(len(led_footprints) - 1):
         # Get pads
-        dout_pad = get_pad_by_number(current_fp, PAD_DOUT)
-        din_pad = get_pad_by_number(next_fp, PAD_DIN)
+        dout_pad = pad_index[idx].get(PAD_DOUT)
+        din_pad = pad_index[idx + 1].get(PAD_DIN)
 
         if not dout_pad or not din_pad:
+            led_num = led_footprints[idx][0]
+            next_num = led_footprints[idx + 1][0]
             print(f"  Warning: Missing pads for {LED_PREFIX}{led_num} -> {LED_PREFIX}{next_num}")
             errors += 1
             continue
 
-        # Calculate row/col positions for routing decision
-        current_row, current_col = get_led_row_col(idx)
-        next_row, next_col = get_led_row_col(idx + 1)
+        if is_transition[idx]:
+            transitions.append((dout_pad, din_pad))
+        else:
+            same_row.append((dout_pad, din_pad))
 
-        # Route with intelligence
-        segs = route_with_via_if_needed(
-            board, dout_pad, din_pad, TRACE_WIDTH,
-            current_row, current_col, next_row, next_col
-        )
-        total_segments += segs
+    # Route all same-row connections, then all row transitions, so each
+    # loop does one kind of work
+    for dout_pad, din_pad in same_row:
+        total_segments += route_same_row(board, commit, dout_pad, din_pad, TRACE_WIDTH_NM)
+    print(f"  Routed {len(same_row)} same-row connections on top layer")
 
-        # Progress indicator
-        if (idx + 1) % 100 == 0:
-            print(f"  Routed {idx + 1}/{len(led_footprints)-1} connections ({total_segments} segments)...")
+    for dout_pad, din_pad in transitions:
+        total_segments += route_row_transition(board, commit, dout_pad, din_pad, TRACE_WIDTH_NM)
+    print(f"  Routed {len(transitions)} row transitions via bottom layer")
+
+    push_commit(board, commit, "Route LED matrix")
 
     print(f"\n✓ Created {total_segments} routing segments")
     if errors > 0:
@@ -190,24 +207,29 @@ def route_data_lanes_smart(board, led_footprints):
     return total_segments
 
 
-def main():
-    """Main routing function"""
+def is_interactive():
+    """True when stdin is a terminal (the KiCad console is); piped/headless runs are not"""
+    isatty = getattr(sys.stdin, "isatty", None)
+    return bool(isatty and isatty())
+
+
+def main(confirm=None):
+    """
+    Main routing function
+    confirm: prompt before routing; None prompts only when stdin is a terminal
+    """
     board = pcbnew.GetBoard()
 
     # Get LED footprints
-    footprints = board.GetFootprints()
     led_footprints = []
 
-    for fp in footprints:
+    for fp in board.GetFootprints():
         ref = fp.GetReference()
-        if ref.startswith(LED_PREFIX):
-            try:
-                num = int(ref[len(LED_PREFIX):])
-                led_footprints.append((num, fp))
-            except ValueError:
-                pass
+        suffix = ref[len(LED_PREFIX):]
+        if ref.startswith(LED_PREFIX) and suffix.isdigit():
+            led_footprints.append((int(suffix), fp))
 
-    led_footprints.sort(key=lambda x: x[0])
+    led_footprints.sort(key=itemgetter(0))
 
     print(f"\nFound {len(led_footprints)} LEDs")
     print(f"Trace width: {TRACE_WIDTH}mm")
@@ -219,13 +241,16 @@ def main():
     print(f"  - All tracks assigned to proper nets")
     print(f"  - Expected: ~{COLS_PER_LANE * LANES * (ROWS-1) * 3} vias (row transitions only)\n")
 
-    response = input("Start routing? (y/n): ")
-    if response.lower() != 'y':
-        print("Cancelled")
-        return
+    if confirm is None:
+        confirm = is_interactive()
+    if confirm:
+        response = input("Start routing? (y/n): ")
+        if response.lower() != 'y':
+            print("Cancelled")
+            return
 
     # Route data lanes
-    route_data_lanes_smart(board, led_footprints)
+    route_data_lanes_smart(board, led_footprints, build_pad_index(led_footprints))
 
     # Refresh board
     pcbnew.Refresh()
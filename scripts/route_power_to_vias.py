@@ -11,6 +11,9 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/route_power_to_vias.py').read())
 """
 
+import re
+from operator import itemgetter
+
 import pcbnew
 
 # Matrix configuration (must match placement scripts)
@@ -23,6 +26,7 @@ START_Y = 10.0    # mm
 
 # LED configuration
 LED_PREFIX = "D"
+LED_REF_RE = re.compile(rf"{re.escape(LED_PREFIX)}([0-9]+)")  # full reference, e.g. D42
 NUM_LANES = 8
 ROWS_PER_LANE = LED_ROWS // NUM_LANES
 
@@ -30,6 +34,24 @@ ROWS_PER_LANE = LED_ROWS // NUM_LANES
 TRACK_WIDTH = 0.2        # mm (trace width for power connections)
 VIA_OFFSET_X = PITCH_X / 2
 VIA_OFFSET_Y = PITCH_Y / 2
+VIA_TOLERANCE = 0.1      # mm (max offset between expected and actual VIA position)
+
+# Track width in KiCad internal units, converted once at load
+TRACK_WIDTH_NM = pcbnew.FromMM(TRACK_WIDTH)
+
+# LED and VIA grid in KiCad internal units (one VIA per 2×2 LED block)
+START_X_NM = pcbnew.FromMM(START_X)
+START_Y_NM = pcbnew.FromMM(START_Y)
+PITCH_X_NM = pcbnew.FromMM(PITCH_X)
+PITCH_Y_NM = pcbnew.FromMM(PITCH_Y)
+BLOCK_PITCH_X_NM = pcbnew.FromMM(2 * PITCH_X)
+BLOCK_PITCH_Y_NM = pcbnew.FromMM(2 * PITCH_Y)
+FIRST_VIA_X_NM = pcbnew.FromMM(START_X + VIA_OFFSET_X)
+FIRST_VIA_Y_NM = pcbnew.FromMM(START_Y + VIA_OFFSET_Y)
+VIA_TOLERANCE_NM = pcbnew.FromMM(VIA_TOLERANCE)
+
+# perf: track class bound once at load; create_track runs once per LED
+_PCB_TRACK = pcbnew.PCB_TRACK
 
 # Layer for routing (usually top layer)
 ROUTING_LAYER = "F.Cu"
@@ -37,61 +59,109 @@ ROUTING_LAYER = "F.Cu"
 
 def get_led_footprints(board):
     """Get all LED footprints sorted by reference number"""
-    footprints = board.GetFootprints()
     led_footprints = []
 
-    for fp in footprints:
-        ref = fp.GetReference()
-        if ref.startswith(LED_PREFIX):
-            try:
-                num = int(ref[len(LED_PREFIX):])
-                led_footprints.append((num, fp))
-            except ValueError:
-                pass
+    for fp in board.GetFootprints():
+        match = LED_REF_RE.fullmatch(fp.GetReference())
+        if match:
+            led_footprints.append((int(match.group(1)), fp))
 
-    led_footprints.sort(key=lambda x: x[0])
+    led_footprints.sort(key=itemgetter(0))
     return led_footprints
 
 
-def get_via_at_position(board, x_mm, y_mm, tolerance_mm=0.1):
-    """Find a VIA near the specified position"""
-    x_nm = pcbnew.FromMM(x_mm)
-    y_nm = pcbnew.FromMM(y_mm)
-    tolerance_nm = pcbnew.FromMM(tolerance_mm)
+def get_vias(board):
+    """Snapshot the board's VIAs, in board order, with one walk over the tracks"""
+    VIA_T = pcbnew.PCB_VIA_T
+    return [track for track in board.GetTracks() if track.Type() == VIA_T]
+
+
+def build_via_index(vias):
+    """
+    Index the VIAs by grid cell. Cells are VIA_TOLERANCE wide, so a lookup
+    only has to check the 3×3 cells around a point instead of scanning
+    every track.
+    """
+    cell_nm = VIA_TOLERANCE_NM
+    via_index = {}
+
+    for order, track in enumerate(vias):
+        via_pos = track.GetPosition()
+        key = (via_pos.x // cell_nm, via_pos.y // cell_nm)
+        via_index.setdefault(key, []).append((order, via_pos.x, via_pos.y, track))
+
+    return via_index
+
+
+def get_via_at_position(via_index, x_nm, y_nm):
+    """Find a VIA within VIA_TOLERANCE of the specified position (internal units)"""
+    tolerance_nm = VIA_TOLERANCE_NM
+    cell_x = x_nm // tolerance_nm
+    cell_y = y_nm // tolerance_nm
+
+    # Same match rule as a full scan: first VIA in board order that is
+    # within tolerance on both axes
+    best = None
+    for key_x in (cell_x - 1, cell_x, cell_x + 1):
+        for key_y in (cell_y - 1, cell_y, cell_y + 1):
+            for order, via_x, via_y, track in via_index.get((key_x, key_y), ()):
+                if abs(via_x - x_nm) < tolerance_nm and abs(via_y - y_nm) < tolerance_nm:
+                    if best is None or order < best[0]:
+                        best = (order, track)
 
-    for track in board.GetTracks():
-        if track.Type() == pcbnew.PCB_VIA_T:
-            via_pos = track.GetPosition()
-            dx = abs(via_pos.x - x_nm)
-            dy = abs(via_pos.y - y_nm)
-            if dx < tolerance_nm and dy < tolerance_nm:
-                return track
+    return best[1] if best else None
 
-    return None
 
+def get_pads_map(footprint):
+    """Map a footprint's pads by number in one pass: {pad_number: pad}"""
+    return {pad.GetNumber(): pad for pad in footprint.Pads()}
 
-def get_pad_by_number(footprint, pad_number):
-    """Get a specific pad from a footprint by its number"""
-    for pad in footprint.Pads():
-        if pad.GetNumber() == str(pad_number):
-            return pad
-    return None
 
+def get_block_via_position(fp_pos):
+    """
+    Centre-VIA position (x_nm, y_nm) of the 2×2 block an LED sits in,
+    snapped from the LED's own position. The half-pitch shift keeps LEDs
+    placed on the grid well clear of the block boundaries.
+    """
+    block_col = (fp_pos.x - START_X_NM + PITCH_X_NM // 2) // BLOCK_PITCH_X_NM
+    block_row = (fp_pos.y - START_Y_NM + PITCH_Y_NM // 2) // BLOCK_PITCH_Y_NM
+    return (FIRST_VIA_X_NM + block_col * BLOCK_PITCH_X_NM,
+            FIRST_VIA_Y_NM + block_row * BLOCK_PITCH_Y_NM)
 
-def create_track(board, start_pos, end_pos, width_mm, layer_name, net):
+
+def begin_commit(board):
+    """
+    Open a BOARD_COMMIT so every new track lands in one batch with a
+    single connectivity/undo update. Falls back to the board itself (same
+    Add interface) when the pcbnew bindings don't expose BOARD_COMMIT.
+    """
+    commit_class = getattr(pcbnew, "BOARD_COMMIT", None)
+    return commit_class(board) if commit_class else board
+
+
+def push_commit(board, commit, message):
+    """
+    Apply a batch opened with begin_commit. On the board.Add fallback,
+    connectivity (ratsnest) is rebuilt once here for the whole batch.
+    """
+    if commit is not board:
+        commit.Push(message)
+    elif hasattr(board, "BuildConnectivity"):
+        board.BuildConnectivity()
+
+
+def create_track(board, commit, start_pos, end_pos, width_nm, layer_id, net):
     """Create a track segment"""
-    track = pcbnew.PCB_TRACK(board)
+    track = _PCB_TRACK(board)
     track.SetStart(start_pos)
     track.SetEnd(end_pos)
-    track.SetWidth(pcbnew.FromMM(width_mm))
-
-    layer_id = board.GetLayerID(layer_name)
+    track.SetWidth(width_nm)
     track.SetLayer(layer_id)
 
     if net:
         track.SetNet(net)
 
-    board.Add(track)
+    commit.Add(track)
     return track
 
 
@@ -100,7 +170,6 @@ def route_power_to_vias():
     board = pcbnew.GetBoard()
 
     led_footprints = get_led_footprints(board)
-    pixels_per_lane = ROWS_PER_LANE * LED_COLS
 
     print(f"\nRouting power connections for {len(led_footprints)} LEDs")
     print(f"Track width: {TRACK_WIDTH}mm")
@@ -110,41 +179,44 @@ def route_power_to_vias():
     vias_not_found = 0
     pads_not_found = 0
 
-    for idx, (led_num, fp) in enumerate(led_footprints):
-        # Calculate LED position in grid (same logic as placement script)
-        lane = idx // pixels_per_lane
-        pixel_in_lane = idx % pixels_per_lane
-        row_in_lane = pixel_in_lane // LED_COLS
-        col = pixel_in_lane % LED_COLS
-
-        # Serpentine: reverse direction on odd rows
-        if row_in_lane % 2 == 1:
-            col = LED_COLS - 1 - col
-
-        row = lane * ROWS_PER_LANE + row_in_lane
-
-        # Calculate which 2×2 block this LED belongs to
-        block_col = col // 2
-        block_row = row // 2
-
-        # Calculate center VIA position for this block
-        via_x = START_X + (block_col * 2 * PITCH_X) + VIA_OFFSET_X
-        via_y = START_Y + (block_row * 2 * PITCH_Y) + VIA_OFFSET_Y
+    # Snapshot and index the VIAs once instead of scanning all tracks for every LED
+    vias = get_vias(board)
+    if not vias:
+        print("No VIAs found on board - run place_power_vias.py first")
+        return
+    print(f"Found {len(vias)} VIAs")
+    via_index = build_via_index(vias)
+
+    # Routing layer is the same for every track; look it up once
+    layer_id = board.GetLayerID(ROUTING_LAYER)
+    commit = begin_commit(board)
+    via_info = {}
+
+    # Tracks only reach the board when the commit is pushed, so there is no
+    # per-LED progress output; the summary below reports the result
+    for led_num, fp in led_footprints:
+        # Centre VIA of the 2×2 block this LED sits in
+        via_x_nm, via_y_nm = get_block_via_position(fp.GetPosition())
 
         # Find the VIA
-        via = get_via_at_position(board, via_x, via_y)
+        via = get_via_at_position(via_index, via_x_nm, via_y_nm)
         if not via:
             vias_not_found += 1
             if vias_not_found <= 5:  # Only print first few warnings
-                print(f"  Warning: VIA not found for {LED_PREFIX}{led_num} at ({via_x:.3f}, {via_y:.3f})")
+                print(f"  Warning: VIA not found for {LED_PREFIX}{led_num} at ({pcbnew.ToMM(via_x_nm):.3f}, {pcbnew.ToMM(via_y_nm):.3f})")
             continue
 
-        via_pos = via.GetPosition()
-        via_net = via.GetNet()
+        # Each block VIA serves four LEDs; read its position and net once
+        info = via_info.get(id(via))
+        if info is None:
+            via_net = via.GetNet()
+            info = via_info[id(via)] = (via.GetPosition(), via_net, via_net.GetNetname())
+        via_pos, via_net, via_netname = info
 
         # Get VDD (pin 2) and GND (pin 3) pads
-        vdd_pad = get_pad_by_number(fp, 2)
-        gnd_pad = get_pad_by_number(fp, 3)
+        pads = get_pads_map(fp)
+        vdd_pad = pads.get("2")
+        gnd_pad = pads.get("3")
 
         if not vdd_pad or not gnd_pad:
             pads_not_found += 1
@@ -153,26 +225,22 @@ def route_power_to_vias():
             continue
 
         # Create tracks from pads to VIA
-        # VDD pad to VIA (if VIA is on VDD net)
-        vdd_pos = vdd_pad.GetPosition()
-        vdd_net = vdd_pad.GetNet()
-
-        # Only route if pad and via are on same net, or via has no net yet
-        if via_net.GetNetname() == "GND":
+        # Only route the pad that is on the VIA's net; skip VIAs without one
+        if via_netname == "GND":
             # Route GND pad to VIA
             gnd_pos = gnd_pad.GetPosition()
-            create_track(board, gnd_pos, via_pos, TRACK_WIDTH, ROUTING_LAYER, via_net)
+            create_track(board, commit, gnd_pos, via_pos, TRACK_WIDTH_NM, layer_id, via_net)
             tracks_created += 1
-        elif via_net.GetNetname() == "VDD":
+        elif via_netname == "VDD":
             # Route VDD pad to VIA
-            create_track(board, vdd_pos, via_pos, TRACK_WIDTH, ROUTING_LAYER, via_net)
+            vdd_pos = vdd_pad.GetPosition()
+            create_track(board, commit, vdd_pos, via_pos, TRACK_WIDTH_NM, layer_id, via_net)
             tracks_created += 1
         else:
             # VIA has no net or unknown net, skip
             pass
 
-        if (idx + 1) % 100 == 0:
-            print(f"  Processed {idx + 1}/{len(led_footprints)} LEDs...")
+    push_commit(board, commit, "Route power pads to block VIAs")
 
     print(f"\n✓ Routing complete")
     print(f"  Tracks created: {tracks_created}")
@@ -16,8 +16,11 @@ Usage in KiCad Scripting Console:
     exec(open('scripts/route_power_to_vias_smart.py').read())
 """
 
-import pcbnew
 import math
+import re
+from operator import itemgetter
+
+import pcbnew
 
 # Matrix configuration (must match placement scripts)
 LED_COLS = 40
@@ -29,6 +32,7 @@ START_Y = 10.0    # mm
 
 # LED configuration
 LED_PREFIX = "D"
+LED_REF_RE = re.compile(rf"{re.escape(LED_PREFIX)}([0-9]+)")  # full reference, e.g. D42
 NUM_LANES = 8
 ROWS_PER_LANE = LED_ROWS // NUM_LANES
 
@@ -36,92 +40,154 @@ ROWS_PER_LANE = LED_ROWS // NUM_LANES
 TRACK_WIDTH = 0.25        # mm (trace width for power connections)
 VIA_SEARCH_RADIUS = 2.5   # mm (how far to search for VIAs)
 
+# Track width and search radius in KiCad internal units, converted once at load
+TRACK_WIDTH_NM = pcbnew.FromMM(TRACK_WIDTH)
+VIA_SEARCH_RADIUS_NM = pcbnew.FromMM(VIA_SEARCH_RADIUS)
+
+# perf: track class bound once at load; create_track runs once per pad
+_PCB_TRACK = pcbnew.PCB_TRACK
+
 # Layer for routing
 ROUTING_LAYER = "F.Cu"
 
 
 def get_led_footprints(board):
     """Get all LED footprints sorted by reference number"""
-    footprints = board.GetFootprints()
     led_footprints = []
 
-    for fp in footprints:
-        ref = fp.GetReference()
-        if ref.startswith(LED_PREFIX):
-            try:
-                num = int(ref[len(LED_PREFIX):])
-                led_footprints.append((num, fp))
-            except ValueError:
-                pass
+    for fp in board.GetFootprints():
+        match = LED_REF_RE.fullmatch(fp.GetReference())
+        if match:
+            led_footprints.append((int(match.group(1)), fp))
 
-    led_footprints.sort(key=lambda x: x[0])
+    led_footprints.sort(key=itemgetter(0))
     return led_footprints
 
 
-def distance(pos1, pos2):
-    """Calculate distance between two positions"""
-    dx = pcbnew.ToMM(pos2.x - pos1.x)
-    dy = pcbnew.ToMM(pos2.y - pos1.y)
-    return math.sqrt(dx * dx + dy * dy)
-
-
-def find_nearest_via(board, pad_pos, max_distance_mm):
-    """Find the nearest VIA to a pad within max_distance"""
-    nearest_via = None
-    nearest_dist = float('inf')
-
-    for track in board.GetTracks():
-        if track.Type() == pcbnew.PCB_VIA_T:
-            via_pos = track.GetPosition()
-            dist = distance(pad_pos, via_pos)
-
-            if dist < max_distance_mm and dist < nearest_dist:
-                nearest_via = track
-                nearest_dist = dist
-
-    return nearest_via, nearest_dist
-
-
-def get_pad_by_number(footprint, pad_number):
-    """Get a specific pad from a footprint by its number"""
-    for pad in footprint.Pads():
-        if pad.GetNumber() == str(pad_number):
-            return pad
-    return None
-
-
-def create_track(board, start_pos, end_pos, width_mm, layer_name, net):
+def distance_sq(x1, y1, x2, y2):
+    """Squared distance between two positions, in internal units (exact ints)"""
+    dx = x2 - x1
+    dy = y2 - y1
+    return dx * dx + dy * dy
+
+
+def get_vias(board):
+    """Snapshot the board's VIAs, in board order, with one walk over the tracks"""
+    VIA_T = pcbnew.PCB_VIA_T
+    return [track for track in board.GetTracks() if track.Type() == VIA_T]
+
+
+def build_via_grid(vias, cell_nm):
+    """
+    Bucket the VIAs into square cells of cell_nm (internal units).
+    Returns (cell_nm, {(cell_x, cell_y): [(order, x_nm, y_nm, via)]}).
+    With cell_nm >= the search radius, a nearest-VIA query only has to look
+    at the 3×3 cells around the pad.
+    """
+    cells = {}
+
+    for order, track in enumerate(vias):
+        via_pos = track.GetPosition()
+        key = (via_pos.x // cell_nm, via_pos.y // cell_nm)
+        cells.setdefault(key, []).append((order, via_pos.x, via_pos.y, track))
+
+    return cell_nm, cells
+
+
+def find_nearest_via(via_grid, pad_pos, max_distance_nm):
+    """Find the nearest VIA to a pad within max_distance (internal units)"""
+    cell_nm, cells = via_grid
+
+    # Read the pad position once; the distance loop below then runs on
+    # plain ints stored in the grid, with no pcbnew object access
+    pad_x = pad_pos.x
+    pad_y = pad_pos.y
+    cell_x = pad_x // cell_nm
+    cell_y = pad_y // cell_nm
+    max_sq = max_distance_nm * max_distance_nm
+
+    # Measure every VIA in the surrounding cells in one pass, then let min()
+    # pick the closest; ties go to the VIA that comes first in board order.
+    # VIAs further than the radius along either axis can't be in range, so
+    # they are dropped before the distance is computed.
+    candidates = [
+        (distance_sq(pad_x, pad_y, via_x, via_y), order, via)
+        for key_x in (cell_x - 1, cell_x, cell_x + 1)
+        for key_y in (cell_y - 1, cell_y, cell_y + 1)
+        for order, via_x, via_y, via in cells.get((key_x, key_y), ())
+        if abs(via_x - pad_x) <= max_distance_nm and abs(via_y - pad_y) <= max_distance_nm
+    ]
+    in_range = [candidate for candidate in candidates if candidate[0] < max_sq]
+
+    if not in_range:
+        return None, float('inf')
+
+    # Squared distances compare the same as distances; only the winner
+    # is converted back to mm
+    nearest_sq, _, nearest_via = min(in_range)
+    return nearest_via, pcbnew.ToMM(math.sqrt(nearest_sq))
+
+
+def get_pads_map(footprint):
+    """Map a footprint's pads by number in one pass: {pad_number: pad}"""
+    return {pad.GetNumber(): pad for pad in footprint.Pads()}
+
+
+def begin_commit(board):
+    """
+    Open a BOARD_COMMIT so every new track lands in one batch with a
+    single connectivity/undo update. Falls back to the board itself (same
+    Add interface) when the pcbnew bindings don't expose BOARD_COMMIT.
+    """
+    commit_class = getattr(pcbnew, "BOARD_COMMIT", None)
+    return commit_class(board) if commit_class else board
+
+
+def push_commit(board, commit, message):
+    """
+    Apply a batch opened with begin_commit. On the board.Add fallback,
+    connectivity (ratsnest) is rebuilt once here for the whole batch.
+    """
+    if commit is not board:
+        commit.Push(message)
+    elif hasattr(board, "BuildConnectivity"):
+        board.BuildConnectivity()
+
+
+def create_track(board, commit, start_pos, end_pos, width_nm, layer_id, net):
     """Create a track segment"""
-    track = pcbnew.PCB_TRACK(board)
+    track = _PCB_TRACK(board)
     track.SetStart(start_pos)
     track.SetEnd(end_pos)
-    track.SetWidth(pcbnew.FromMM(width_mm))
-
-    layer_id = board.GetLayerID(layer_name)
+    track.SetWidth(width_nm)
     track.SetLayer(layer_id)
 
     if net:
         track.SetNet(net)
 
-    board.Add(track)
+    commit.Add(track)
     return track
 
 
-def route_pad_to_via(board, pad, via, pad_name):
+def route_pad_to_via(board, commit, pad, via, pad_name, layer_id):
     """Route a pad to a via, handling net assignment"""
-    pad_pos = pad.GetPosition()
-    via_pos = via.GetPosition()
+    # Read each net and its name once
     pad_net = pad.GetNet()
+    pad_netname = pad_net.GetNetname()
     via_net = via.GetNet()
+    via_netname = via_net.GetNetname() if via_net else ""
 
     # If VIA has no net, assign it the pad's net
-    if not via_net or via_net.GetNetname() == "":
+    if via_netname == "":
+        if commit is not board:
+            commit.Modify(via)
         via.SetNet(pad_net)
-        via_net = pad_net
+        via_netname = pad_netname
 
     # Only route if nets match
-    if pad_net.GetNetname() == via_net.GetNetname():
-        create_track(board, pad_pos, via_pos, TRACK_WIDTH, ROUTING_LAYER, pad_net)
+    if pad_netname == via_netname:
+        create_track(board, commit, pad.GetPosition(), via.GetPosition(),
+                     TRACK_WIDTH_NM, layer_id, pad_net)
         return True
     else:
         return False
@@ -143,25 +209,46 @@ def route_power_connections():
     vdd_failed = 0
     gnd_failed = 0
 
-    for idx, (led_num, fp) in enumerate(led_footprints):
-        # Get VDD (pin 2) and GND (pin 3) pads
-        vdd_pad = get_pad_by_number(fp, 2)
-        gnd_pad = get_pad_by_number(fp, 3)
+    # Snapshot and index the VIAs once; cells as wide as the search radius
+    vias = get_vias(board)
+    if not vias:
+        print("No VIAs found on board - run place_power_vias.py first")
+        return
+    print(f"Found {len(vias)} VIAs")
+    via_grid = build_via_grid(vias, VIA_SEARCH_RADIUS_NM)
+
+    # Routing layer is the same for every track; look it up once
+    layer_id = board.GetLayerID(ROUTING_LAYER)
+    commit = begin_commit(board)
+
+    # Get VDD (pin 2) and GND (pin 3) pads of every LED
+    led_pads = []
+    for led_num, fp in led_footprints:
+        pads = get_pads_map(fp)
+        vdd_pad = pads.get("2")
+        gnd_pad = pads.get("3")
 
         if not vdd_pad or not gnd_pad:
             print(f"  Warning: Pads not found for {LED_PREFIX}{led_num}")
             continue
 
-        # Find nearest VIA for each pad
-        vdd_pos = vdd_pad.GetPosition()
-        gnd_pos = gnd_pad.GetPosition()
+        led_pads.append((vdd_pad, gnd_pad))
 
-        vdd_via, vdd_dist = find_nearest_via(board, vdd_pos, VIA_SEARCH_RADIUS)
-        gnd_via, gnd_dist = find_nearest_via(board, gnd_pos, VIA_SEARCH_RADIUS)
+    # Find nearest VIA for each pad in two sweeps: all VDD pads, then all
+    # GND pads. The queries only read the grid, so they can run up front.
+    vdd_vias = [find_nearest_via(via_grid, vdd_pad.GetPosition(), VIA_SEARCH_RADIUS_NM)[0]
+                for vdd_pad, gnd_pad in led_pads]
+    gnd_vias = [find_nearest_via(via_grid, gnd_pad.GetPosition(), VIA_SEARCH_RADIUS_NM)[0]
+                for vdd_pad, gnd_pad in led_pads]
 
+    # Route in LED order (VDD then GND per LED), so VIAs without a net are
+    # claimed by the same pads as when searching and routing per LED.
+    # Tracks only reach the board when the commit is pushed, so there is no
+    # per-LED progress output; the summary below reports the result
+    for (vdd_pad, gnd_pad), vdd_via, gnd_via in zip(led_pads, vdd_vias, gnd_vias):
         # Route VDD
         if vdd_via:
-            if route_pad_to_via(board, vdd_pad, vdd_via, "VDD"):
+            if route_pad_to_via(board, commit, vdd_pad, vdd_via, "VDD", layer_id):
                 vdd_routed += 1
             else:
                 vdd_failed += 1
@@ -170,15 +257,14 @@ def route_power_connections():
 
         # Route GND
         if gnd_via:
-            if route_pad_to_via(board, gnd_pad, gnd_via, "GND"):
+            if route_pad_to_via(board, commit, gnd_pad, gnd_via, "GND", layer_id):
                 gnd_routed += 1
             else:
                 gnd_failed += 1
         else:
             gnd_failed += 1
 
-        if (idx + 1) % 100 == 0:
-            print(f"  Processed {idx + 1}/{len(led_footprints)} LEDs...")
+    push_commit(board, commit, "Route power pads to nearest VIAs")
 
     print(f"\n✓ Routing complete")
     print(f"  VDD connections: {vdd_routed} routed, {vdd_failed} failed")
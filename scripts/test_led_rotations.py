@@ -24,18 +24,13 @@ BLOCK_ROTATIONS = {
     (False, False):  90,   # Bottom-right: pins 3,1 / 4,2 → VDD/GND face left+up
 }
 
-def get_led_by_number(board, led_num):
-    """Get LED footprint by number"""
-    ref = f"{LED_PREFIX}{led_num}"
-    for fp in board.GetFootprints():
-        if fp.GetReference() == ref:
-            return fp
-    return None
-
 def test_rotations():
     """Test first 2×2 block (D1, D2, D41, D42 for serpentine, or adjust for your numbering)"""
     board = pcbnew.GetBoard()
 
+    # Index footprints by reference once instead of scanning per LED
+    fp_by_ref = {fp.GetReference(): fp for fp in board.GetFootprints()}
+
     print("\n=== Testing 2×2 LED Block Rotations ===\n")
     print("Expected pattern (pins at each corner):")
     print("  D1  (col 0, row 0): 2 4 / 1 3  →  270° rotation")
@@ -55,7 +50,7 @@ def test_rotations():
     ]
 
     for led_num, col, row, expected_rot in test_leds:
-        fp = get_led_by_number(board, led_num)
+        fp = fp_by_ref.get(f"{LED_PREFIX}{led_num}")
         if not fp:
             print(f"⚠ Warning: {LED_PREFIX}{led_num} not found")
             continue